@@ -14,7 +14,6 @@ import static
 import re
 import string
 
-from PIL import Image
 from flask import Flask, make_response, render_template
 from render_utils import make_context, smarty_filter, urlencode_filter
 from werkzeug.debug import DebuggedApplication
@@ -26,6 +25,17 @@ app.add_template_filter(smarty_filter, name='smarty')
 app.add_template_filter(urlencode_filter, name='urlencode')
 
 
+def _load_cover_index():
+    """
+    Load the cover and tag image metadata written by `fab data.load_images`.
+    """
+    try:
+        with open(app_config.COVER_INDEX_PATH) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {'covers': {}, 'tags': {}}
+
+
 @app.route('/')
 @oauth.oauth_required
 def index():
@@ -44,29 +54,33 @@ def index():
     return make_response(render_template('index.html', **context))
 
 
-@app.route('/share/<slug>.html')
-def share(slug):
-    featured_book = None
-    context = make_context()
+def _load_books_by_slug():
+    """
+    Load the books written by `fab data.load_books`, by slug.
+    """
+    books = {}
+
     with open('www/static-data/books.json', 'rb') as f:
-        books = json.load(f)
-        for book in books:
-            if book.get('slug') == slug:
-                featured_book = book
-                break
+        for book in json.load(f):
+            books.setdefault(book.get('slug'), book)
 
-    if not featured_book:
-        return 404
+    return books
+
+
+def render_share(book, cover=None):
+    """
+    Render the share page for a book.
+
+    `render_all` calls this with the books and covers it has already
+    loaded, rather than loading them again for each page.
+    """
+    context = make_context()
 
+    featured_book = dict(book)
     featured_book['thumb'] = "%sassets/cover/%s.jpg" % (context['SHARE_URL'], featured_book['slug'])
-    try:
-        book_image = Image.open('www/assets/cover/%s.jpg' % featured_book['slug'])
-        width, height = book_image.size
-        context['thumb_width'] = width
-        context['thumb_height'] = height
-    except IOError:
-        context['thumb_width'] = None
-        context['thumb_height'] = None
+    cover = cover or {}
+    context['thumb_width'] = cover.get('width')
+    context['thumb_height'] = cover.get('height')
 
     context['twitter_handle'] = 'nprbooks'
     context['book'] = featured_book
@@ -74,8 +88,22 @@ def share(slug):
     return make_response(render_template('share.html', **context))
 
 
-@app.route('/tag_share/<slug>.html')
-def tag_share(slug):
+@app.route('/share/<slug>.html')
+def share(slug):
+    featured_book = _load_books_by_slug().get(slug)
+
+    if not featured_book:
+        return 404
+
+    cover = _load_cover_index()['covers'].get(slug)
+
+    return render_share(featured_book, cover)
+
+
+def render_tag_share(slug, tag_images):
+    """
+    Render the share page for a tag, given the tag images by name.
+    """
     featured_tag = None
     context = make_context()
 
@@ -92,14 +120,9 @@ def tag_share(slug):
     context['tag_thumb'] = "%sassets/tag/%s.jpg" % (context['SHARE_URL'],
                                                     featured_tag['img'])
 
-    try:
-        book_image = Image.open('www/assets/tag/%s.jpg' % featured_tag['img'])
-        width, height = book_image.size
-        context['thumb_width'] = width
-        context['thumb_height'] = height
-    except IOError:
-        context['thumb_width'] = None
-        context['thumb_height'] = None
+    tag_image = tag_images.get(featured_tag['img'], {})
+    context['thumb_width'] = tag_image.get('width')
+    context['thumb_height'] = tag_image.get('height')
 
     context['twitter_handle'] = 'nprbooks'
     context['tag'] = featured_tag
@@ -107,6 +130,11 @@ def tag_share(slug):
     return make_response(render_template('tag_share.html', **context))
 
 
+@app.route('/tag_share/<slug>.html')
+def tag_share(slug):
+    return render_tag_share(slug, _load_cover_index()['tags'])
+
+
 @app.route('/seamus')
 def seamus():
     """
@@ -101,6 +101,17 @@ COPY EDITING
 COPY_GOOGLE_DOC_KEY = '1zQMjIfIwqD-INhQDj_Dr06YlTRw5A6KJ5Z9nxBA6qtQ'
 COPY_PATH = 'data/copy.xlsx'
 
+# Parsed copy written by `fab text.update`, loaded instead of the
+# spreadsheet when it's newer. See `render_utils.load_copy`.
+COPY_SNAPSHOT_PATH = 'data/copy.json'
+
+# Dimensions, size and colour of each cover and tag image, written by
+# `fab data.load_images` so pages can be rendered without opening images.
+COVER_INDEX_PATH = 'www/static-data/covers.json'
+
+# Widths, in pixels, of the resized copies of each cover used in srcset
+COVER_WIDTHS = [150, 300, 600]
+
 # Key for Google Spreadsheet that contains book entries
 # This is the key for a production version.  Want to use a testing version?
 # Consider defining it in a `local_settings` module.
@@ -14,6 +14,7 @@ import app_config
 
 # Other fabfiles
 import assets
+import benchmark
 import data
 import flat
 import issues
@@ -0,0 +1,457 @@
+#!/usr/bin/env python
+
+"""
+Offline benchmarks for the data pipeline.
+
+Each benchmark builds a scratch project directory with a synthetic books
+CSV and copy spreadsheet, then runs `parse_books_csv`, `load_images` and
+`make_promotion_thumb` against a local stub server that stands in for
+NPR.org, iTunes, Goodreads and Baker & Taylor.  Nothing goes out to the
+network.
+
+Each stage runs in its own process, so that the peak memory reported is
+the stage's own.  Results are written as JSON and can be compared with an
+earlier run:
+
+    fab benchmark.run
+    fab benchmark.run:rows=1000,latency=0.2
+    fab benchmark.run:compare=data/benchmarks/benchmark-20171101-120000.json
+
+"""
+
+import BaseHTTPServer
+import csv
+from datetime import datetime
+import json
+import logging
+from multiprocessing import cpu_count, Process, Queue
+import os
+import platform
+from Queue import Empty
+import random
+import resource
+import shutil
+import SocketServer
+import tempfile
+import time
+import traceback
+from StringIO import StringIO
+from urlparse import parse_qs, urlparse, urlunparse
+
+from fabric.api import task
+from openpyxl import Workbook
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+import app_config
+import data
+import fetch
+from http_cache import HTTPCache
+import instrument
+from utils import write_atomic
+
+
+logging.basicConfig(format=app_config.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(app_config.LOG_LEVEL)
+
+
+DEFAULT_ROWS = [100, 1000, 10000]
+# `make_promotion_thumb` needs more than one column of covers to size the
+# mosaic, so smaller catalogs can't be benchmarked
+MIN_ROWS = data.TOTAL_IMAGES / data.IMAGE_COLUMNS + 1
+# Seconds the stub server waits before answering each request
+DEFAULT_LATENCY = 0.05
+BENCHMARK_OUTPUT_PATH = 'data/benchmarks/benchmark-%Y%m%d-%H%M%S.json'
+STAGES = ['parse_books_csv', 'load_images', 'make_promotion_thumb']
+# Seconds between checks that a stage's process is still running
+STAGE_POLL_INTERVAL = 1
+
+TAGS = [
+    ('funny', 'Funny Stuff'),
+    ('staff-picks', 'Staff Picks'),
+    ('eye-opening', 'Eye-Opening Reads'),
+    ('tales-from-around-the-world', 'Tales From Around The World'),
+    ('for-art-lovers', 'For Art Lovers'),
+]
+# One in this many ISBNs gets a placeholder image from Baker & Taylor, so
+# that the NPR.org fallback is exercised.
+PLACEHOLDER_COVER_EVERY = 20
+
+BOOKS_CSV_COLUMNS = [
+    'title',
+    'author',
+    'book_seamus_id',
+    'hide_ibooks',
+    'text',
+    'reviewer',
+    'reviewer id',
+    'reviewer link',
+    'html text',
+    'isbn',
+    'asin',
+    'oclc',
+    'itunes_id',
+    'goodreads_id',
+    'external links html',
+    'tags',
+]
+
+BOOK_PAGE_HTML = '''<html><body>
+<div class="bookedition"><div class="image"><img src="https://media.npr.org/assets/bakertaylor/covers/%(id)s-s99-c15.jpg"></div></div>
+<div class="storylist">
+<article class="item"><h3 class="slug">Book Reviews</h3><h2 class="title"><a href="http://www.npr.org/%(id)s/review">A review of book %(id)s</a></h2></article>
+<article class="item"><h3 class="slug">Author Interviews</h3><h2 class="title"><a href="http://www.npr.org/%(id)s/interview">An interview about book %(id)s</a></h2></article>
+</div>
+<div class="readexcerpt"><a href="#excerpt">Read an excerpt</a></div>
+</body></html>'''
+
+GOODREADS_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<GoodreadsResponse><search><results><work>
+<best_book><id type="integer">%s</id><title>Book</title></best_book>
+</work></results></search></GoodreadsResponse>'''
+
+
+class StageError(Exception):
+    """
+    Raised when a stage of the pipeline fails.
+    """
+    pass
+
+
+def _isbn10(n):
+    """
+    Make a valid ISBN-10 from a number.
+    """
+    digits = '%09d' % n
+    check = (11 - sum((10 - i) * int(d) for i, d in enumerate(digits)) % 11) % 11
+    return digits + ('X' if check == 10 else str(check))
+
+
+def make_books_csv(path, rows):
+    """
+    Write a synthetic books CSV like the one published from the books
+    spreadsheet.
+    """
+    rand = random.Random(rows)
+
+    with open(path, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow([name.upper() if name == 'isbn' else name
+                         for name in BOOKS_CSV_COLUMNS])
+
+        for i in range(rows):
+            text = ' '.join(['Sentence %i about book %i, which is worth reading.' % (j, i)
+                             for j in range(rand.randint(3, 12))])
+            tags = rand.sample([name for slug, name in TAGS], rand.randint(1, 3))
+            writer.writerow([
+                'Book %i: A Novel' % i,
+                'Author %i' % i,
+                str(500000000 + i),
+                '',
+                text,
+                'Reviewer %i' % (i % 50),
+                'NPR Staff',
+                '',
+                '',
+                _isbn10(100000000 + i),
+                '',
+                '',
+                str(900000000 + i),
+                '',
+                '',
+                ','.join(tags),
+            ])
+
+
+def make_copy_xlsx(path):
+    """
+    Write a synthetic copy spreadsheet with the sheets the data pipeline
+    reads.
+    """
+    workbook = Workbook()
+
+    sheet = workbook.active
+    sheet.title = 'tags'
+    sheet.append(['key', 'value', 'img'])
+    for slug, name in TAGS:
+        sheet.append([slug, name, slug])
+
+    sheet = workbook.create_sheet(title='content')
+    sheet.append(['key', 'value'])
+    sheet.append(['genre', 'Genre'])
+
+    sheet = workbook.create_sheet(title='share')
+    sheet.append(['key', 'value'])
+
+    workbook.save(path)
+
+
+def _make_cover(seed, size):
+    """
+    Make a noisy JPEG, which compresses about as well as a real cover.
+    """
+    rand = random.Random(seed)
+    image = Image.new('RGB', size)
+    image.putdata([(rand.randint(0, 255), rand.randint(0, 255), rand.randint(0, 255))
+                   for i in range(size[0] * size[1])])
+    image = image.resize((size[0] * 4, size[1] * 4), Image.BILINEAR)
+
+    f = StringIO()
+    image.save(f, 'JPEG', quality=95)
+    return f.getvalue()
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answer requests for every upstream the data pipeline uses.
+    """
+    def do_GET(self):
+        time.sleep(self.server.latency)
+
+        url = urlparse(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+
+        if url.path.endswith('/Jacket.aspx'):
+            isbn = params.get('Value', '')
+            if hash(isbn) % PLACEHOLDER_COVER_EVERY == 0:
+                self._respond(self.server.placeholder, 'image/jpeg')
+            else:
+                covers = self.server.covers
+                self._respond(covers[hash(isbn) % len(covers)], 'image/jpeg')
+        elif url.path.startswith('/assets/'):
+            self._respond(self.server.covers[0], 'image/jpeg')
+        elif url.path == '/search/index.xml':
+            self._respond(GOODREADS_XML % params.get('q', ''), 'application/xml')
+        elif url.path in ('/search', '/lookup'):
+            results = [{'trackName': params.get('term', ''),
+                        'trackViewUrl': 'https://itunes.apple.com/us/book/id123?mt=11'}]
+            self._respond(json.dumps({'resultCount': 1, 'results': results}),
+                          'application/json')
+        else:
+            seamus_id = url.path.strip('/')
+            self._respond(BOOK_PAGE_HTML % {'id': seamus_id}, 'text/html')
+
+    def _respond(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(latency):
+    """
+    Start the stub server in a separate process.
+
+    Returns:
+        tuple: The server process and the port it's listening on.
+
+    """
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    server.latency = latency
+    server.covers = [_make_cover(i, (75, 110 + i * 5)) for i in range(8)]
+    server.placeholder = _make_cover(0, (5, 5))
+
+    process = Process(target=server.serve_forever)
+    process.daemon = True
+    process.start()
+
+    port = server.server_address[1]
+    server.server_close()
+    return process, port
+
+
+class StubAdapter(HTTPAdapter):
+    """
+    Send every request to the stub server, whatever its host.
+    """
+    def __init__(self, port, **kwargs):
+        HTTPAdapter.__init__(self, **kwargs)
+        self.port = port
+
+    def send(self, request, **kwargs):
+        url = urlparse(request.url)
+        request.url = urlunparse(('http', '127.0.0.1:%i' % self.port) + url[2:])
+        return HTTPAdapter.send(self, request, **kwargs)
+
+
+def _run_stage(stage, workdir, port, queue):
+    """
+    Run a stage of the pipeline and report how long it took, or the
+    traceback if it fails.
+
+    Runs in its own process.
+    """
+    try:
+        queue.put(_time_stage(stage, workdir, port))
+    except Exception:
+        queue.put({'error': traceback.format_exc()})
+
+
+def _time_stage(stage, workdir, port):
+    os.chdir(workdir)
+
+    for prefix in ('http://', 'https://'):
+        fetch.SESSION.mount(prefix, StubAdapter(
+            port, pool_connections=fetch.DEFAULT_WORKERS,
+            pool_maxsize=fetch.DEFAULT_WORKERS))
+    fetch.CACHE = HTTPCache(fetch.HTTP_CACHE_PATH, fetch.HTTP_CACHE_MAX_BYTES)
+    instrument.reset()
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+
+    getattr(data, stage)()
+    fetch.save_cache()
+
+    counters = instrument.get_report()['counters']
+    return {
+        'seconds': time.time() - start,
+        'start_rss_kb': start_rss,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'children_max_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        'http_requests': counters.get('http.requests', 0),
+        'http_bytes': counters.get('http.bytes', 0),
+    }
+
+
+def _wait_for_stage(stage, process, queue):
+    """
+    Wait for the result of a stage, raising `StageError` if it fails or
+    its process dies without a result.
+    """
+    while True:
+        try:
+            result = queue.get(timeout=STAGE_POLL_INTERVAL)
+            break
+        except Empty:
+            if process.exitcode is not None and queue.empty():
+                raise StageError('%s exited with code %i without a result' % (
+                    stage, process.exitcode))
+
+    if 'error' in result:
+        raise StageError('%s failed:\n%s' % (stage, result['error']))
+
+    return result
+
+
+def benchmark(rows, port, keep=False):
+    """
+    Run each stage of the pipeline on a synthetic catalog.
+
+    Returns:
+        list: A result dict for each stage.
+
+    """
+    workdir = tempfile.mkdtemp(prefix='books-benchmark-')
+    results = []
+
+    try:
+        os.makedirs(os.path.join(workdir, 'data'))
+        os.makedirs(os.path.join(workdir, 'www', 'assets', 'img'))
+        make_books_csv(os.path.join(workdir, 'data', 'books.csv'), rows)
+        make_copy_xlsx(os.path.join(workdir, app_config.COPY_PATH))
+
+        for stage in STAGES:
+            queue = Queue()
+            process = Process(target=_run_stage,
+                              args=(stage, workdir, port, queue))
+            process.start()
+            try:
+                result = _wait_for_stage(stage, process, queue)
+            finally:
+                process.join()
+
+            result.update(rows=rows, stage=stage)
+            results.append(result)
+            logger.info('%i rows, %s: %.2fs' % (rows, stage, result['seconds']))
+    finally:
+        if keep:
+            logger.info('Kept benchmark files in %s' % workdir)
+        else:
+            shutil.rmtree(workdir)
+
+    return results
+
+
+def format_results(results, previous=None):
+    """
+    Format results as a table, with the change in time from a previous
+    run if there is one.
+    """
+    previous_seconds = {}
+    for result in previous or []:
+        previous_seconds[(result['rows'], result['stage'])] = result['seconds']
+
+    lines = ['%8s %-22s %10s %10s %12s %10s' % (
+        'rows', 'stage', 'seconds', 'change', 'max rss MB', 'requests')]
+
+    for result in results:
+        before = previous_seconds.get((result['rows'], result['stage']))
+        change = '%+.1f%%' % (100.0 * (result['seconds'] - before) / before) if before else ''
+        lines.append('%8i %-22s %10.2f %10s %12.1f %10i' % (
+            result['rows'],
+            result['stage'],
+            result['seconds'],
+            change,
+            max(result['max_rss_kb'], result['children_max_rss_kb']) / 1024.0,
+            result['http_requests']))
+
+    return '\n'.join(lines)
+
+
+@task
+def run(rows=None, latency=DEFAULT_LATENCY, output=None, compare=None,
+        keep='false'):
+    """
+    Benchmark the data pipeline against a local stub server.
+
+    `rows` is a number of rows, or several separated by spaces, each at
+    least `MIN_ROWS`, and `latency` is the stub server's response time in
+    seconds.  Results are written to `output` and compared with the results
+    in `compare`.
+    """
+    rows = [int(n) for n in rows.split()] if rows else DEFAULT_ROWS
+    if min(rows) < MIN_ROWS:
+        raise ValueError('Benchmarks need at least %i rows' % MIN_ROWS)
+    output = output or datetime.now().strftime(BENCHMARK_OUTPUT_PATH)
+    latency = float(latency)
+
+    previous = None
+    if compare:
+        with open(compare) as f:
+            previous = json.load(f)['results']
+
+    # Cover downloads need Baker & Taylor credentials, even fake ones
+    for key in ('BAKER_TAYLOR_USERID', 'BAKER_TAYLOR_PASSWORD'):
+        os.environ.setdefault('%s_%s' % (app_config.PROJECT_FILENAME, key),
+                              'benchmark')
+
+    started = datetime.now()
+    server, port = start_stub_server(latency)
+    results = []
+
+    try:
+        for n in rows:
+            results.extend(benchmark(n, port, keep=(keep == 'true')))
+    finally:
+        server.terminate()
+
+    write_atomic(output, json.dumps({
+        'started': started.isoformat(),
+        'latency': latency,
+        'python': platform.python_version(),
+        'cpus': cpu_count(),
+        'results': results,
+    }, indent=2, sort_keys=True))
+
+    print format_results(results, previous)
+    print 'Results written to %s' % output
@@ -9,19 +9,25 @@ import codecs
 import copytext
 import csv
 import errno
+import hashlib
 from external_links import (
     get_station_coverage_csv,
     get_station_coverage_headlines,
     parse_station_coverage_csv,
     merge_external_links)
+import fetch
+from utils import write_atomic
+import instrument
+from isbn import canonical_isbn, ISBNIndex, to_isbn13
 import json
 import locale
 import os
 import re
+from render_utils import load_copy
 import requests
 import sys
 import string
-import xlrd
+from StringIO import StringIO
 import logging
 import time
 import shutil
@@ -34,6 +40,9 @@ from PIL import Image
 from bs4 import BeautifulSoup
 from datetime import datetime
 from fabric.api import task
+from glob import glob
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
 from facebook import GraphAPI
 from twitter import Twitter, OAuth
 from csvkit.py2 import CSVKitDictReader, CSVKitDictWriter
@@ -44,9 +53,72 @@ logger = logging.getLogger(__name__)
 logger.setLevel(app_config.LOG_LEVEL)
 
 ITUNES_URL_ID_REGEX = re.compile(r'id(\d+)\??')
+# Number of ISBNs to look up in each iTunes API request
+ITUNES_LOOKUP_CHUNK_SIZE = 50
 
 TAGS_TO_SLUGS = {}
 SLUGS_TO_TAGS = {}
+# Position of each tag slug in the tags spreadsheet
+TAG_ORDER = {}
+
+
+# Cover image metadata, keyed by slug. See `get_cover_index`.
+COVER_INDEX = {}
+
+BOOKS_JSON_PATH = 'www/static-data/books.json'
+# Hashes of the CSV rows that went into books.json. See `parse_books_csv`.
+BOOKS_MANIFEST_PATH = 'data/books-manifest.json'
+# Bump to rebuild every book on the next run whenever a change to the code
+# that builds books (`Book`, `get_tags`, `external_links`, `to_isbn13`,
+# `LINK_CATEGORY_MAP`, ...) changes what is written to books.json
+BOOKS_SCHEMA_VERSION = 1
+# Number of book pages fetched at once by `parse_books_csv`, and the
+# number of rows it reads ahead of the books being written.
+PARSE_WORKERS = 8
+PARSE_QUEUE_SIZE = 32
+# Fields written to books.json for each book, in order. See
+# `_serialize_book`.
+BOOKS_JSON_FIELDS = [
+    'slug',
+    'title',
+    'author',
+    'isbn',
+    'isbn13',
+    'itunes_id',
+    'goodreads_id',
+    'book_seamus_id',
+    'hide_ibooks',
+    'genre',
+    'tags',
+    'teaser',
+    'text',
+    'html_text',
+    'reviewer',
+    'reviewer_id',
+    'reviewer_link',
+    'links',
+    'external_links',
+    'cover_widths',
+    'cover_webp',
+]
+# Values that are left out of books.json because the app treats a missing
+# field the same way.  Fields that are None are always left out.
+BOOKS_JSON_DEFAULTS = {
+    'hide_ibooks': '',
+    'html_text': False,
+    'reviewer_link': '',
+    'cover_webp': False,
+}
+# Goodreads IDs resolved so far. See `get_books_goodreads_ids`.
+GOODREADS_JOURNAL_PATH = 'data/goodreads-ids.jsonl'
+# Featured tweets and Facebook posts. See `update_featured_social`.
+FEATURED_JSON_PATH = 'data/featured.json'
+# Rendered featured tweets, by ID. See `_get_featured_tweets`.
+TWEET_CACHE_PATH = 'data/featured-tweets.json'
+# Seconds to wait for each Twitter and Facebook API call
+SOCIAL_TIMEOUT = 10
+# Timings and counts from each run of `update`. See `instrument`.
+RUN_REPORT_PATH = 'data/run-reports/update-%Y%m%d-%H%M%S.json'
 
 # Promotion image constants
 IMAGE_COLUMNS = 26
@@ -59,13 +131,12 @@ def _make_teaser(book):
     """
     tag_stripper = re.compile(r'<.*?>')
 
-    try:
-        img = Image.open('www/assets/cover/%s.jpg' % book.slug)
-        width, height = img.size
+    cover = COVER_INDEX.get(book.slug)
 
+    if cover:
         # Poor man's packing algorithm. How much text will fit?
-        chars = height / 25 * 7
-    except IOError:
+        chars = cover['height'] / 25 * 7
+    else:
         chars = 140
 
     text = tag_stripper.sub('', book.text)
@@ -90,148 +161,277 @@ def _make_teaser(book):
 
     return text[:i] + ' ...'
 
+@task
+def offline():
+    """
+    Only use cached responses for HTTP requests, e.g. fab data.offline data.update
+    """
+    fetch.OFFLINE = True
+
 @task(default=True)
 def update():
     """
     Load books and covers
+
+    Writes a report of how long each stage took to RUN_REPORT_PATH.
     """
-    update_featured_social()
-    logger.setLevel(app_config.LOG_LEVEL)
-    load_books()
-    load_images()
-    make_promotion_thumb()
+    instrument.reset()
 
-@task
-def update_featured_social():
+    with instrument.timer('update'):
+        update_featured_social()
+        logger.setLevel(app_config.LOG_LEVEL)
+        load_books()
+        load_images()
+        make_promotion_thumb()
+
+    instrument.write_report(datetime.now().strftime(RUN_REPORT_PATH))
+
+def _tweet_signature(tweet):
     """
-    Update featured tweets
+    Hash the parts of a tweet that go into its rendered version.
     """
-    COPY = copytext.Copy(app_config.COPY_PATH)
-    secrets = app_config.get_secrets()
+    user = dict((key, tweet['user'][key]) for key in
+                ('id', 'name', 'screen_name', 'profile_image_url', 'url'))
+    return hashlib.sha1(json.dumps([
+        tweet['text'],
+        tweet['entities'],
+        tweet['created_at'],
+        tweet['favorite_count'],
+        tweet['retweet_count'],
+        user,
+    ], sort_keys=True)).hexdigest()
+
+def _render_tweet(tweet):
+    """
+    Get the data for a featured tweet from the Twitter API's response.
 
-    # Twitter
-    print 'Fetching tweets...'
+    Entities are linked in a single pass over the text, using their
+    indices.
+    """
+    creation_date = datetime.strptime(tweet['created_at'],'%a %b %d %H:%M:%S +0000 %Y')
+    creation_date = '%s %i' % (creation_date.strftime('%b'), creation_date.day)
 
-    twitter_api = Twitter(
-        auth=OAuth(
-            secrets['TWITTER_API_OAUTH_TOKEN'],
-            secrets['TWITTER_API_OAUTH_SECRET'],
-            secrets['TWITTER_API_CONSUMER_KEY'],
-            secrets['TWITTER_API_CONSUMER_SECRET']
-        )
-    )
+    tweet_url = 'http://twitter.com/%s/status/%s' % (tweet['user']['screen_name'], tweet['id'])
 
-    tweets = []
+    photo = None
+    subs = []
+
+    for media in tweet['entities'].get('media', []):
+        replacement = '<a href="%s" target="_blank" onclick="_gaq.push([\'_trackEvent\', \'%s\', \'featured-tweet-action\', \'link\', 0, \'%s\']);">%s</a>' % (media['url'], app_config.PROJECT_SLUG, tweet_url, media['display_url'])
+
+        subs.append((media['indices'], replacement))
+
+        if media['type'] == 'photo' and not photo:
+            photo = {
+                'url': media['media_url']
+            }
+
+    for url in tweet['entities'].get('urls', []):
+        replacement = '<a href="%s" target="_blank" onclick="_gaq.push([\'_trackEvent\', \'%s\', \'featured-tweet-action\', \'link\', 0, \'%s\']);">%s</a>' % (url['url'], app_config.PROJECT_SLUG, tweet_url, url['display_url'])
+
+        subs.append((url['indices'], replacement))
+
+    for hashtag in tweet['entities'].get('hashtags', []):
+        replacement = '<a href="https://twitter.com/hashtag/%s" target="_blank" onclick="_gaq.push([\'_trackEvent\', \'%s\', \'featured-tweet-action\', \'hashtag\', 0, \'%s\']);">%s</a>' % (hashtag['text'], app_config.PROJECT_SLUG, tweet_url, '#%s' % hashtag['text'])
+
+        subs.append((hashtag['indices'], replacement))
+
+    text = tweet['text']
+    html = []
+    position = 0
+
+    for (start, end), replacement in sorted(subs):
+        # Skip entities that overlap one we've already linked
+        if start < position:
+            continue
+        html.append(text[position:start])
+        html.append(replacement)
+        position = end
+
+    html.append(text[position:])
+
+    # https://dev.twitter.com/docs/api/1.1/get/statuses/show/%3Aid
+    return {
+        'id': tweet['id'],
+        'url': tweet_url,
+        'html': ''.join(html),
+        'favorite_count': tweet['favorite_count'],
+        'retweet_count': tweet['retweet_count'],
+        'user': {
+            'id': tweet['user']['id'],
+            'name': tweet['user']['name'],
+            'screen_name': tweet['user']['screen_name'],
+            'profile_image_url': tweet['user']['profile_image_url'],
+            'url': tweet['user']['url'],
+        },
+        'creation_date': creation_date,
+        'photo': photo
+    }
+
+def _get_featured_ids(COPY, key):
+    """
+    Get the IDs from the featured post URLs in the share sheet.
+    """
+    ids = []
 
     for i in range(1, 4):
-        tweet_url = COPY['share']['featured_tweet%i' % i]
+        url = COPY['share']['%s%i' % (key, i)]
 
-        if isinstance(tweet_url, copytext.Error) or unicode(tweet_url).strip() == '':
+        if isinstance(url, copytext.Error) or unicode(url).strip() == '':
             continue
 
-        tweet_id = unicode(tweet_url).split('/')[-1]
+        ids.append(unicode(url).split('/')[-1])
 
-        tweet = twitter_api.statuses.show(id=tweet_id)
+    return ids
 
-        creation_date = datetime.strptime(tweet['created_at'],'%a %b %d %H:%M:%S +0000 %Y')
-        creation_date = '%s %i' % (creation_date.strftime('%b'), creation_date.day)
+def _get_featured_tweets(COPY, secrets):
+    """
+    Fetch and render the featured tweets.
 
-        tweet_url = 'http://twitter.com/%s/status/%s' % (tweet['user']['screen_name'], tweet['id'])
+    All the tweets are fetched with one call to the bulk lookup API.
+    Rendered tweets are cached by ID and signature, so tweets that haven't
+    changed aren't rendered again.
+    """
+    print 'Fetching tweets...'
 
-        photo = None
-        html = tweet['text']
-        subs = {}
+    tweet_ids = _get_featured_ids(COPY, 'featured_tweet')
+    if not tweet_ids:
+        return []
 
-        for media in tweet['entities'].get('media', []):
-            original = tweet['text'][media['indices'][0]:media['indices'][1]]
-            replacement = '<a href="%s" target="_blank" onclick="_gaq.push([\'_trackEvent\', \'%s\', \'featured-tweet-action\', \'link\', 0, \'%s\']);">%s</a>' % (media['url'], app_config.PROJECT_SLUG, tweet_url, media['display_url'])
+    twitter_api = Twitter(
+        auth=OAuth(
+            secrets['TWITTER_API_OAUTH_TOKEN'],
+            secrets['TWITTER_API_OAUTH_SECRET'],
+            secrets['TWITTER_API_CONSUMER_KEY'],
+            secrets['TWITTER_API_CONSUMER_SECRET']
+        )
+    )
 
-            subs[original] = replacement
+    # https://dev.twitter.com/rest/reference/get/statuses/lookup
+    results = twitter_api.statuses.lookup(_id=','.join(tweet_ids),
+                                          _timeout=SOCIAL_TIMEOUT)
+    tweets_by_id = dict((tweet['id_str'], tweet) for tweet in results)
 
-            if media['type'] == 'photo' and not photo:
-                photo = {
-                    'url': media['media_url']
-                }
+    try:
+        with open(TWEET_CACHE_PATH) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        cache = {}
 
-        for url in tweet['entities'].get('urls', []):
-            original = tweet['text'][url['indices'][0]:url['indices'][1]]
-            replacement = '<a href="%s" target="_blank" onclick="_gaq.push([\'_trackEvent\', \'%s\', \'featured-tweet-action\', \'link\', 0, \'%s\']);">%s</a>' % (url['url'], app_config.PROJECT_SLUG, tweet_url, url['display_url'])
+    new_cache = {}
+    tweets = []
 
-            subs[original] = replacement
+    for tweet_id in tweet_ids:
+        tweet = tweets_by_id.get(tweet_id)
+        if tweet is None:
+            logger.warning('Featured tweet %s not found' % tweet_id)
+            continue
 
-        for hashtag in tweet['entities'].get('hashtags', []):
-            original = tweet['text'][hashtag['indices'][0]:hashtag['indices'][1]]
-            replacement = '<a href="https://twitter.com/hashtag/%s" target="_blank" onclick="_gaq.push([\'_trackEvent\', \'%s\', \'featured-tweet-action\', \'hashtag\', 0, \'%s\']);">%s</a>' % (hashtag['text'], app_config.PROJECT_SLUG, tweet_url, '#%s' % hashtag['text'])
+        signature = _tweet_signature(tweet)
+        cached = cache.get(tweet_id)
+        if cached is None or cached['signature'] != signature:
+            cached = {
+                'signature': signature,
+                'tweet': _render_tweet(tweet),
+            }
 
-            subs[original] = replacement
+        new_cache[tweet_id] = cached
+        tweets.append(cached['tweet'])
 
-        for original, replacement in subs.items():
-            html =  html.replace(original, replacement)
+    if new_cache != cache:
+        write_atomic(TWEET_CACHE_PATH, json.dumps(new_cache))
 
-        # https://dev.twitter.com/docs/api/1.1/get/statuses/show/%3Aid
-        tweets.append({
-            'id': tweet['id'],
-            'url': tweet_url,
-            'html': html,
-            'favorite_count': tweet['favorite_count'],
-            'retweet_count': tweet['retweet_count'],
-            'user': {
-                'id': tweet['user']['id'],
-                'name': tweet['user']['name'],
-                'screen_name': tweet['user']['screen_name'],
-                'profile_image_url': tweet['user']['profile_image_url'],
-                'url': tweet['user']['url'],
-            },
-            'creation_date': creation_date,
-            'photo': photo
-        })
+    return tweets
 
-    # Facebook
+def _get_facebook_post(fb_api, fb_id):
+    """
+    Fetch a featured Facebook post, and its author, likes and comments.
+    """
+    post = fb_api.get_object(fb_id)
+
+    def _get_object(request):
+        path, args = request
+        return fb_api.get_object(path, **args)
+
+    # These only depend on the post, so fetch them all at once
+    user, user_picture, likes, comments = fetch.map_concurrent(_get_object, [
+        (post['from']['id'], {}),
+        ('%s/picture' % post['from']['id'], {}),
+        ('%s/likes' % fb_id, {'summary': 'true'}),
+        ('%s/comments' % fb_id, {'summary': 'true'}),
+    ])
+    #shares = fb_api.get_object('%s/sharedposts' % fb_id)
+
+    creation_date = datetime.strptime(post['created_time'],'%Y-%m-%dT%H:%M:%S+0000')
+    creation_date = '%s %i' % (creation_date.strftime('%b'), creation_date.day)
+
+    # https://developers.facebook.com/docs/graph-api/reference/v2.0/post
+    return {
+        'id': post['id'],
+        'message': post['message'],
+        'link': {
+            'url': post['link'],
+            'name': post['name'],
+            'caption': (post['caption'] if 'caption' in post else None),
+            'description': post['description'],
+            'picture': post['picture']
+        },
+        'from': {
+            'name': user['name'],
+            'link': user['link'],
+            'picture': user_picture['url']
+        },
+        'likes': likes['summary']['total_count'],
+        'comments': comments['summary']['total_count'],
+        #'shares': shares['summary']['total_count'],
+        'creation_date': creation_date
+    }
+
+def _get_featured_facebook_posts(COPY, secrets):
+    """
+    Fetch the featured Facebook posts.
+    """
     print 'Fetching Facebook posts...'
 
-    fb_api = GraphAPI(secrets['FACEBOOK_API_APP_TOKEN'])
+    fb_api = GraphAPI(secrets['FACEBOOK_API_APP_TOKEN'], timeout=SOCIAL_TIMEOUT)
 
-    facebook_posts = []
+    return fetch.map_concurrent(lambda fb_id: _get_facebook_post(fb_api, fb_id),
+                                _get_featured_ids(COPY, 'featured_facebook'))
 
-    for i in range(1, 4):
-        fb_url = COPY['share']['featured_facebook%i' % i]
+@task
+@instrument.timed
+def update_featured_social():
+    """
+    Update featured tweets
 
-        if isinstance(fb_url, copytext.Error) or unicode(fb_url).strip() == '':
-            continue
+    Tweets and Facebook posts are fetched at the same time.  If either
+    can't be fetched, the ones from the last update are kept.
+    """
+    COPY = load_copy()
+    secrets = app_config.get_secrets()
+
+    try:
+        with open(FEATURED_JSON_PATH) as f:
+            previous = json.load(f)
+    except (IOError, ValueError):
+        previous = {}
+
+    sections = [
+        ('tweets', _get_featured_tweets),
+        ('facebook_posts', _get_featured_facebook_posts),
+    ]
+
+    def _get_section(section):
+        name, get_posts = section
+        try:
+            with instrument.timer('featured_social', name):
+                return get_posts(COPY, secrets)
+        except Exception, e:
+            logger.error('Could not update featured %s, keeping the old ones: %s' % (
+                name.replace('_', ' '), e))
+            return previous.get(name, [])
 
-        fb_id = unicode(fb_url).split('/')[-1]
-
-        post = fb_api.get_object(fb_id)
-        user  = fb_api.get_object(post['from']['id'])
-        user_picture = fb_api.get_object('%s/picture' % post['from']['id'])
-        likes = fb_api.get_object('%s/likes' % fb_id, summary='true')
-        comments = fb_api.get_object('%s/comments' % fb_id, summary='true')
-        #shares = fb_api.get_object('%s/sharedposts' % fb_id)
-
-        creation_date = datetime.strptime(post['created_time'],'%Y-%m-%dT%H:%M:%S+0000')
-        creation_date = '%s %i' % (creation_date.strftime('%b'), creation_date.day)
-
-        # https://developers.facebook.com/docs/graph-api/reference/v2.0/post
-        facebook_posts.append({
-            'id': post['id'],
-            'message': post['message'],
-            'link': {
-                'url': post['link'],
-                'name': post['name'],
-                'caption': (post['caption'] if 'caption' in post else None),
-                'description': post['description'],
-                'picture': post['picture']
-            },
-            'from': {
-                'name': user['name'],
-                'link': user['link'],
-                'picture': user_picture['url']
-            },
-            'likes': likes['summary']['total_count'],
-            'comments': comments['summary']['total_count'],
-            #'shares': shares['summary']['total_count'],
-            'creation_date': creation_date
-        })
+    tweets, facebook_posts = fetch.map_concurrent(_get_section, sections)
 
     # Render to JSON
     output = {
@@ -239,32 +439,45 @@ def update_featured_social():
         'facebook_posts': facebook_posts
     }
 
-    with open('data/featured.json', 'w') as f:
+    if output == previous:
+        logger.info('Featured posts have not changed')
+        return
+
+    with open(FEATURED_JSON_PATH, 'w') as f:
         json.dump(output, f)
 
 class Book(object):
     """
     A single book instance.
     __init__ cleans the data.
+
+    Books have a fixed set of fields, which are None unless the
+    spreadsheet row sets them.
     """
-    isbn = None
-    isbn13 = None
-    hide_ibooks = False
-    title = None
-    author = None
-    genre = None
-    reviewer = None
-    text = None
-    slug = None
-    tags = None
-    book_seamus_id = None
-    itunes_id = None
-    goodreads_slug = None
-    author_seamus_id = None
-    author_seamus_headline = None
-
-    review_seamus_id = None
-    review_seamus_headline = None
+    __slots__ = (
+        'title',
+        'book_seamus_id',
+        'slug',
+        'author',
+        'hide_ibooks',
+        'genre',
+        'text',
+        'reviewer',
+        'reviewer_id',
+        'reviewer_link',
+        'teaser',
+        'cover_widths',
+        'cover_webp',
+        'html_text',
+        'isbn',
+        'isbn13',
+        'oclc',
+        'itunes_id',
+        'goodreads_id',
+        'links',
+        'external_links',
+        'tags',
+    )
 
     def __unicode__(self):
         """
@@ -272,10 +485,16 @@ class Book(object):
         """
         return self.title
 
-    def __init__(self, **kwargs):
+    def __init__(self, links=None, **kwargs):
         """
         Process all fields for row in the spreadsheet for serialization
+
+        `links` are the links from the book page, if they have already
+        been fetched. See `_fetch_book_links`.
         """
+        for field in self.__slots__:
+            setattr(self, field, None)
+
         self.title = self._process_text(kwargs['title'])
         logger.debug('Processing %s' % self.title)
         self.book_seamus_id = kwargs['book_seamus_id']
@@ -290,6 +509,11 @@ class Book(object):
 
         self.teaser = _make_teaser(self)
 
+        cover = COVER_INDEX.get(self.slug)
+        if cover and cover.get('widths'):
+            self.cover_widths = cover['widths']
+            self.cover_webp = cover['webp']
+
         if kwargs['html text']:
             self.html_text = True
         else:
@@ -299,7 +523,7 @@ class Book(object):
         if self.isbn:
             try:
                 int(self.isbn[:8])
-                self.isbn13 = self._process_isbn13(self.isbn)
+                self.isbn13 = to_isbn13(self.isbn)
             except ValueError:
                 # Take into account ebooks as the unique format
                 if self.isbn != kwargs['asin']:
@@ -318,7 +542,9 @@ class Book(object):
         if kwargs['goodreads_id'] != "":
             self.goodreads_id = kwargs['goodreads_id']
 
-        if (kwargs['book_seamus_id']):
+        if links is not None:
+            self.links = links
+        elif (kwargs['book_seamus_id']):
             # Only search for links if there's a seamus ID
             self.links = self._process_links(kwargs['book_seamus_id'])
         else:
@@ -327,6 +553,18 @@ class Book(object):
         self.tags = self._process_tags(kwargs['tags'])
 
 
+    def to_dict(self):
+        """
+        Get a dictionary of the book's fields
+        """
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+    def to_json_fragment(self, sizes=None):
+        """
+        Serialize the book for books.json. See `_serialize_book`.
+        """
+        return _serialize_book(self.to_dict(), sizes)
+
     def _process_text(self, value):
         """
         Clean text field by replacing smart quotes and removing extra spaces
@@ -356,18 +594,8 @@ class Book(object):
                 else:
                     logger.warning('%s: Unknown tag "%s"' % (self.title, item))
 
-        # Sort items by order in spreadsheet
-        copy = copytext.Copy(app_config.COPY_PATH)
-
-        ordered_items = []
-        slugs = [tag['key'].__str__() for tag in copy['tags']]
-
-        # Add slugs to new list in order from tags spreadsheet, not input order
-        for slug in slugs:
-            if slug in item_list:
-                ordered_items.append(slug)
-
-        return ordered_items
+        # Sort items by order in tags spreadsheet, not input order
+        return sorted(set(item_list), key=TAG_ORDER.get)
 
     def _process_external_links(self, value):
         """
@@ -384,62 +612,10 @@ class Book(object):
         """
         Get links for a book from NPR.org book page
         """
-        book_page_url = 'http://www.npr.org/%s' % value
-        logger.debug('%s: Getting links from %s' % (self.title, book_page_url))
-        r = requests.get(book_page_url)
-        soup = BeautifulSoup(r.content, 'html.parser')
-        items = soup.select('.storylist article.item')
-        item_list = []
-        urls = []
-        for item in items:
-            link = {
-                'category': '',
-                'title': item.select('.title')[0].text.strip(),
-                'url': item.select('.title a')[0].attrs.get('href'),
-            }
-            if link['url'] not in urls:
-                category_elements = item.select('.slug')
-                if len(category_elements):
-                    category = category_elements[0].text.strip()
-                    if category in app_config.LINK_CATEGORY_MAP.keys():
-                        link['category'] = app_config.LINK_CATEGORY_MAP.get(category)
-                    else:
-                        link['category'] = app_config.LINK_CATEGORY_DEFAULT
+        return _parse_book_links(self.title, value, _get_book_page(value))
 
-                urls.append(link['url'])
-                item_list.append(link)
-                logger.debug('%s: Adding link %s - %s (%s)' % (self.title, link['category'], link['title'], link['url']))
-            else:
-                logger.info('%s: Duplicate link %s on %s' % (self.title, link['title'], link['url']))
-
-        first_read = soup.select('.readexcerpt a')
-        if len(first_read):
-            link = {
-                'category': 'Read an excerpt',
-                'url': '%s#excerpt' % book_page_url,
-                'title': '',
-            }
-            item_list.append(link)
-            logger.debug('%s: Adding link %s - %s (%s)' % (self.title, link['category'], link['title'], link['url']))
-
-        return item_list
-
-    def _process_isbn13(self, value):
-        """
-        Calculate ISBN-13, see: http://www.ehow.com/how_5928497_convert-10-digit-isbn-13.html
-        """
-        if value.startswith('978'):
-            return value
-        else:
-            isbn = '978%s' % value[:9]
-            sum_even = 3 * sum(map(int, [isbn[1], isbn[3], isbn[5], isbn[7], isbn[9], isbn[11]]))
-            sum_odd = sum(map(int, [isbn[0], isbn[2], isbn[4], isbn[6], isbn[8], isbn[10]]))
-            remainder = (sum_even + sum_odd) % 10
-            check = 10 - remainder if remainder else 0
-            isbn13 = '%s%s' % (isbn, check)
-            return isbn13
-
-    def _slugify(self, value):
+    @staticmethod
+    def _slugify(value):
         """
         Slugify book title
         """
@@ -449,11 +625,96 @@ class Book(object):
         slug = slug[:254]
         return slug
 
+    @staticmethod
+    def _get_itunes_id_from_result(result):
+        """
+        Get the iBooks ID from an iTunes API result
+        """
+        itunes_url = result.get('trackViewUrl', '')
+        m = ITUNES_URL_ID_REGEX.search(itunes_url)
+        if m:
+            return m.group(1)
+
+        logger.warning('Did not find ibook id in %s' % itunes_url)
+        return None
+
+    @classmethod
+    def lookup_itunes_ids(cls, books):
+        """
+        Use the itunes lookup API to get IDs for many books at once
+
+        Books are looked up by ISBN, `ITUNES_LOOKUP_CHUNK_SIZE` at a time.
+        Results are matched to books by canonical ISBN, since iTunes returns
+        ISBN-13s and the spreadsheet mostly has ISBN-10s.  Results don't
+        always include the ISBN, so those are matched to a book by title.  Books that aren't found are searched for by title
+        with `get_itunes_id()`.
+
+        Args:
+            books (list): List of `(isbn, title)` tuples.
+
+        Returns:
+            dict: iTunes IDs keyed by ISBN.
+
+        """
+        lookup_api_tpl = 'https://itunes.apple.com/lookup'
+        itunes_ids = {}
+        books = [(isbn.strip(), title) for isbn, title in books if isbn.strip()]
+
+        for i in range(0, len(books), ITUNES_LOOKUP_CHUNK_SIZE):
+            chunk = books[i:i + ITUNES_LOOKUP_CHUNK_SIZE]
+            chunk_isbns = ISBNIndex(isbn for isbn, title in chunk)
+            isbns_by_title = {}
+            for isbn, title in chunk:
+                isbns_by_title[cls._slugify(title.split(':')[0])] = isbn
+
+            params = {
+                'isbn': ','.join(isbn for isbn, title in chunk).encode('utf-8'),
+                'country': 'US',
+            }
+            r = fetch.get(lookup_api_tpl, params=params, source='itunes_lookup')
+            if r.status_code != 200:
+                logger.warning('did not receive a 200 when using itunes lookup api (HTTP %i)' % r.status_code)
+                continue
+
+            for result in r.json()['results']:
+                isbn = chunk_isbns.get(result.get('isbn') or '')
+                if isbn is None:
+                    if len(chunk) == 1:
+                        isbn = chunk[0][0]
+                    else:
+                        main_title = result.get('trackName', '').split(':')[0]
+                        isbn = isbns_by_title.get(cls._slugify(main_title))
+
+                if isbn is None or itunes_ids.get(isbn):
+                    continue
+
+                itunes_ids[isbn] = cls._get_itunes_id_from_result(result)
+
+        misses = [(isbn, title) for isbn, title in books
+                  if not itunes_ids.get(isbn) and title]
+        logger.info('Found %i of %i books by ISBN, searching for %i by title' % (
+            len(books) - len(misses), len(books), len(misses)))
+
+        def _search(book):
+            return book[0], cls.get_itunes_id(book[1])
+
+        for isbn, itunes_id in fetch.map_concurrent(_search, misses):
+            itunes_ids[isbn] = itunes_id
+
+        return itunes_ids
+
     @classmethod
-    def get_itunes_id(cls, title):
+    def get_itunes_id(cls, title, isbn=None):
         """
         Use itunes search API
+
+        If an ISBN is given, try looking the book up by ISBN first.
         """
+        if isbn:
+            itunes_id = cls.lookup_itunes_ids([(isbn, '')]).get(isbn.strip())
+            if itunes_id:
+                return itunes_id
+
         itunes_id = None
         search_api_tpl = 'https://itunes.apple.com/search'
         main_title = title.split(':')[0]
@@ -470,35 +731,34 @@ class Book(object):
         logger.info('url: %s' % search_api_url)
 
         # Get search api results.
-        r = requests.get(search_api_url, params=params)
+        r = fetch.get(search_api_tpl, params=params, source='itunes_search')
         if r.status_code == 200:
             results = r.json()
             numResults = results['resultCount']
             if numResults:
                 if numResults > 1:
                     logger.warning('More than one result for %s, picking first' % main_title)
-                itunes_url = results['results'][0]['trackViewUrl']
-                m = ITUNES_URL_ID_REGEX.search(itunes_url)
-                if m:
-                    itunes_id = m.group(1)
+                itunes_id = cls._get_itunes_id_from_result(results['results'][0])
+                if itunes_id:
                     logger.info('itunes_id: %s' % itunes_id)
-                else:
-                    logger.warning('Did not find ibook id in %s' % itunes_url)
             else:
                 logger.warning('no results found for %s' % main_title)
         else:
-            logger.warning('did not receive a 200 when using itunes search api')
+            logger.warning('did not receive a 200 when using itunes search api (HTTP %i) for %s' % (r.status_code, main_title))
         return itunes_id
 
     def fetch_itunes_id(self):
         """Retrieve a book's iTunes ID from the iTunes Search API"""
-        self.itunes_id = self.get_itunes_id(self.title)
+        self.itunes_id = self.get_itunes_id(self.title, self.isbn)
         return self
 
     @classmethod
-    def get_goodreads_id(cls, isbn):
+    def get_goodreads_id(cls, isbn, max_age=None):
         """
         Use GoodReads search API
+
+        A cached search is reused for up to `max_age` seconds, see
+        `fetch.get`.
         """
         secrets = app_config.get_secrets()
 
@@ -509,12 +769,10 @@ class Book(object):
             'key': secrets['GOODREADS_API_KEY'],
             'q': isbn.encode('utf-8')
         }
-        query_string = urlencode(params)
-
-        search_api_url = '%s?%s' % (search_api_tpl, query_string)
 
         # Get search api results.
-        r = requests.get(search_api_url, params=params)
+        r = fetch.get(search_api_tpl, params=params, source='goodreads',
+                      max_age=max_age)
 
         if r.status_code == 200:
             tree = ElementTree.fromstring(r.content)
@@ -533,6 +791,64 @@ class Book(object):
         return self
 
 
+def _get_book_page_url(book_seamus_id):
+    """Get the URL of a book's NPR.org book page"""
+    return 'http://www.npr.org/%s' % book_seamus_id
+
+
+def _get_book_page(book_seamus_id):
+    """
+    Get the HTML of a book's NPR.org book page.
+    Pages are kept in the HTTP cache rather than in memory, so the cover
+    download reuses the page fetched while parsing the book.
+    """
+    r = fetch.get(_get_book_page_url(book_seamus_id), source='npr')
+    return r.content
+
+
+def _parse_book_links(title, book_seamus_id, html):
+    """
+    Get the links for a book from the HTML of its NPR.org book page.
+    """
+    book_page_url = _get_book_page_url(book_seamus_id)
+    logger.debug('%s: Getting links from %s' % (title, book_page_url))
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.select('.storylist article.item')
+    item_list = []
+    urls = []
+    for item in items:
+        link = {
+            'category': '',
+            'title': item.select('.title')[0].text.strip(),
+            'url': item.select('.title a')[0].attrs.get('href'),
+        }
+        if link['url'] not in urls:
+            category_elements = item.select('.slug')
+            if len(category_elements):
+                category = category_elements[0].text.strip()
+                if category in app_config.LINK_CATEGORY_MAP.keys():
+                    link['category'] = app_config.LINK_CATEGORY_MAP.get(category)
+                else:
+                    link['category'] = app_config.LINK_CATEGORY_DEFAULT
+
+            urls.append(link['url'])
+            item_list.append(link)
+            logger.debug('%s: Adding link %s - %s (%s)' % (title, link['category'], link['title'], link['url']))
+        else:
+            logger.info('%s: Duplicate link %s on %s' % (title, link['title'], link['url']))
+
+    first_read = soup.select('.readexcerpt a')
+    if len(first_read):
+        link = {
+            'category': 'Read an excerpt',
+            'url': '%s#excerpt' % book_page_url,
+            'title': '',
+        }
+        item_list.append(link)
+        logger.debug('%s: Adding link %s - %s (%s)' % (title, link['category'], link['title'], link['url']))
+
+    return item_list
+
 
 def get_books_csv():
     """
@@ -541,7 +857,7 @@ def get_books_csv():
     csv_url = 'https://docs.google.com/spreadsheets/d/%s/pub?gid=0&single=true&output=csv' % (
         app_config.DATA_GOOGLE_DOC_KEY)
     logger.debug(csv_url)
-    r = requests.get(csv_url)
+    r = fetch.get(csv_url, source='gdocs')
     if r.headers['content-type'] != 'text/csv':
         logger.error('Unexpected Content-type: %s. Are you sure the spreadsheet is published as csv?' % r.headers['content-type'])
         if app_config.LOCAL_CSV_PATH:
@@ -550,75 +866,257 @@ def get_books_csv():
         with open('data/books.csv', 'wb') as writefile:
             writefile.write(r.content)
 
+def get_cover_index():
+    """
+    Load cover image metadata written by `load_images`.
+    """
+    COVER_INDEX.clear()
+
+    try:
+        with open(app_config.COVER_INDEX_PATH) as f:
+            COVER_INDEX.update(json.load(f)['covers'])
+    except (IOError, ValueError):
+        logger.warning('No cover index found, using default teaser length')
+
 def get_tags():
     """
     Extract tags from COPY doc.
+    Builds the lookups from tag name to slug and from slug to position in
+    the spreadsheet once, rather than for every book.
+
+    Uses the copy snapshot written by `fab text.update` when it's newer
+    than the spreadsheet.
     """
     print 'Extracting tags from COPY'
 
-    book = xlrd.open_workbook(app_config.COPY_PATH)
+    copy = load_copy()
 
-    sheet = book.sheet_by_name('tags')
+    # Forget tags from earlier calls, in case the spreadsheet has changed
+    SLUGS_TO_TAGS.clear()
+    TAGS_TO_SLUGS.clear()
+    TAG_ORDER.clear()
+    seen = set()
 
-    for i in range(1, sheet.nrows):
+    for i, row in enumerate(copy['tags'], 1):
         # The tag spreadsheet has more than key, value now so unpack correspondigly
-        slug, tag = sheet.row_values(i)[0:2]
+        slug, tag = list(row)[0:2]
+
+        slug = (slug or '').strip()
+        tag = (tag or '').replace(u'’', "'").strip()
 
-        slug = slug.strip()
-        tag = tag.replace(u'’', "'").strip()
+        if not slug:
+            continue
 
         SLUGS_TO_TAGS[slug] = tag
         TAGS_TO_SLUGS[tag.lower()] = slug
 
-def parse_books_csv():
+        # A slug listed twice is ordered by its first row
+        if slug not in seen:
+            seen.add(slug)
+            TAG_ORDER[slug] = i
+
+def _hash_row(row):
     """
-    Parses the books CSV to JSON.
-    Creates book objects which are cleaned and then serialized to JSON.
+    Hash the raw fields of a CSV row, and the cover metadata used by its
+    teaser and srcset.
     """
-    get_tags()
+    cover = COVER_INDEX.get(Book._slugify(row['title']), {})
+    cover = [cover.get('height'), cover.get('widths'), cover.get('webp')]
+    return hashlib.sha1(json.dumps([row, cover], sort_keys=True)).hexdigest()
+
+def _hash_tags():
+    """
+    Hash the tag lookups, which every book's tags depend on.
+    """
+    return hashlib.sha1(json.dumps([TAGS_TO_SLUGS, TAG_ORDER], sort_keys=True)).hexdigest()
+
+def _index_books_json(path):
+    """
+    Find the byte offset of each book in books.json, by canonical ISBN.
+
+    `parse_books_csv` writes one book per line, so a book can be read back
+    with `_read_book_at()` without loading the whole file.
+    """
+    offsets = {}
+    offset = 0
+
+    with open(path, 'rb') as f:
+        for line in f:
+            record = line.rstrip().rstrip(',')
+            if record.startswith('{'):
+                offsets[canonical_isbn(json.loads(record)['isbn'])] = offset
+            offset += len(line)
+
+    return offsets
+
+def _read_book_at(f, offset):
+    """
+    Read the book at an offset found by `_index_books_json()`.
+    """
+    f.seek(offset)
+    return json.loads(f.readline().rstrip().rstrip(','))
+
+def _get_books_version():
+    """
+    Hash the settings that decide how a row is turned into a book, so the
+    books from a previous run are only reused if they were built the same
+    way.
+    """
+    return hashlib.sha1(json.dumps([
+        BOOKS_SCHEMA_VERSION,
+        BOOKS_JSON_FIELDS,
+        BOOKS_JSON_DEFAULTS,
+    ], sort_keys=True)).hexdigest()
+
+def _load_previous_books():
+    """
+    Load the manifest and index the books from the last run of
+    `parse_books_csv`.
+
+    Returns a dict of row hashes and a dict of offsets in books.json,
+    both by canonical ISBN. Both are empty if the books can't be reused.
+    """
+    try:
+        with open(BOOKS_MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        offsets = _index_books_json(BOOKS_JSON_PATH)
+    except (IOError, ValueError):
+        return {}, {}
+
+    if manifest.get('version') != _get_books_version():
+        logger.info('Books are built differently, rebuilding all books')
+        return {}, {}
 
-    # Open the CSV.
-    with open('data/books.csv', 'r') as readfile:
+    if manifest.get('tags') != _hash_tags():
+        logger.info('Tags have changed, rebuilding all books')
+        return {}, {}
+
+    return manifest['rows'], offsets
+
+def _read_books_csv(path):
+    """
+    Read the rows of the books CSV that have a title and ISBN.
+    """
+    with open(path, 'r') as readfile:
         reader = CSVKitDictReader(readfile, encoding='utf-8')
         reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
-        books = list(reader)
 
-    logger.info("Start parse_books_csv(): %i rows." % len(books))
+        for book in reader:
+            # Skip books with no title or ISBN
+            if book['title'] == "":
+                continue
 
-    book_list = []
+            if book['isbn'] == "":
+                logger.error('no isbn for title: %s' % book['title'])
+                continue
 
-    tags = {}
+            yield book
 
-    for book in books:
-
-        # Skip books with no title or ISBN
-        if book['title'] == "":
-            continue
+def _fetch_book_links(item):
+    """
+    Fetch and parse the NPR.org book page for a CSV row.
 
-        if book['isbn'] == "":
-            logger.error('no isbn for title: %s' % book['title'])
-            continue
+    Runs in a worker thread so that downloads and parsing overlap building
+    books, and each page is only fetched once. Returns the row, the book
+    from the previous run and the links, or the error if the page couldn't
+    be fetched.
+    """
+    book, previous = item
+    seamus_id = book.get('book_seamus_id')
+    links = None
 
-        # Init a book class, passing our data as kwargs.
-        # The class constructor handles cleaning of the data.
+    if previous is None and seamus_id:
         try:
-            b = Book(**book)
-        except Exception, e:
-            logger.error("Exception while parsing book: %s. Cause %s" % (
-                book['title'],
-                e))
+            with instrument.timer('fetch_book_page', seamus_id):
+                html = _get_book_page(seamus_id)
+            with instrument.timer('parse_book_page', seamus_id):
+                links = _parse_book_links(book['title'], seamus_id, html)
+        except requests.RequestException, e:
+            links = e
+
+    return book, previous, links
+
+def _build_book(book, links=None):
+    """
+    Build a book from a CSV row, and the links from `_fetch_book_links`.
+    """
+    # Init a book class, passing our data as kwargs.
+    # The class constructor handles cleaning of the data.
+    try:
+        with instrument.timer('build_book', book['title']):
+            if isinstance(links, Exception):
+                raise links
+            b = Book(links=links, **book)
+    except Exception, e:
+        logger.error("Exception while parsing book: %s. Cause %s" % (
+            book['title'],
+            e))
+        return None
+
+    return b
+
+def _serialize_book(book_dict, sizes=None):
+    """
+    Serialize a book as compact JSON for books.json.
+
+    Only fields in `BOOKS_JSON_FIELDS` are written, in that order, and
+    fields that are None or in `BOOKS_JSON_DEFAULTS` are left out.  If
+    `sizes` is given, the bytes used by each field are added to it.
+    """
+    pairs = []
+
+    for field in BOOKS_JSON_FIELDS:
+        value = book_dict.get(field)
+        if value is None or BOOKS_JSON_DEFAULTS.get(field, None) == value:
             continue
 
-        for tag in b.tags:
-            if not tags.get(tag):
-                tags[tag] = 1
-            else:
-                tags[tag] += 1
+        pair = '%s:%s' % (json.dumps(field), json.dumps(value, separators=(',', ':')))
+        pairs.append(pair)
+        if sizes is not None:
+            # Count the comma between fields too
+            sizes[field] = sizes.get(field, 0) + len(pair) + 1
+
+    return '{%s}' % ','.join(pairs)
+
+def _log_field_sizes(sizes):
+    """
+    Log the bytes used by each field in books.json, largest first.
+    """
+    total = sum(sizes.values())
+    logger.info('books.json fields by size:')
+    for field, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        logger.info('%-16s %10i bytes %5.1f%%' % (field, size, 100.0 * size / (total or 1)))
+
+def parse_books_csv(full=False):
+    """
+    Parses the books CSV to JSON.
+    Creates book objects which are cleaned and then serialized to JSON.
+
+    Rows are streamed through the pipeline: they are read from the CSV,
+    their book pages are fetched and parsed by a pool of threads, and they
+    are built into books and written out in order as they're ready, so only
+    a few rows are held in memory at once.
 
-        # Grab the dictionary representation of a book.
-        book_list.append(b.__dict__)
+    Rows that haven't changed since the last run reuse the book from the
+    existing books.json, unless `full` is True.
+
+    Books are written with `_serialize_book` and the size of each field is
+    logged at the end.
+    """
+    get_tags()
+    get_cover_index()
+
+    if full:
+        row_hashes, offsets = {}, {}
+    else:
+        row_hashes, offsets = _load_previous_books()
 
-    # Dump the list to JSON.
+    logger.info("Start parse_books_csv()")
+
+    new_row_hashes = {}
+    tags = {}
+    sizes = {}
+    counts = {'rows': 0, 'changed': 0}
 
     # The destination directory, `www/static-data` might not exist if you're
     # bootstrapping the project for the first time, so make sure it does before
@@ -629,16 +1127,81 @@ def parse_books_csv():
         if e.errno != errno.EEXIST:
             raise
 
-    with open('www/static-data/books.json', 'wb') as writefile:
-        writefile.write(json.dumps(book_list))
+    previous_file = open(BOOKS_JSON_PATH, 'rb') if offsets else None
 
-    with open('data/test-itunes-equiv.csv', 'w') as fout:
-        writer = CSVKitDictWriter(fout,
-                                  fieldnames=['title', 'isbn',
-                                              'isbn13', 'itunes_id'],
-                                  extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(book_list)
+    def _classify(books):
+        for book in books:
+            isbn = canonical_isbn(book['isbn'])
+            row_hash = _hash_row(book)
+            new_row_hashes[isbn] = row_hash
+            counts['rows'] += 1
+
+            if row_hashes.get(isbn) == row_hash and isbn in offsets:
+                yield book, _read_book_at(previous_file, offsets[isbn])
+            else:
+                counts['changed'] += 1
+                yield book, None
+
+    rows = fetch.imap_bounded(_fetch_book_links,
+        _classify(_read_books_csv('data/books.csv')),
+        workers=PARSE_WORKERS, maxsize=PARSE_QUEUE_SIZE)
+
+    tmp_path = BOOKS_JSON_PATH + '.tmp'
+
+    try:
+        with open(tmp_path, 'wb') as writefile, \
+                open('data/test-itunes-equiv.csv', 'w') as fout:
+            writer = CSVKitDictWriter(fout,
+                                      fieldnames=['title', 'isbn',
+                                                  'isbn13', 'itunes_id'],
+                                      extrasaction='ignore')
+            writer.writeheader()
+
+            # Write one book per line
+            writefile.write('[')
+            separator = '\n'
+            for book, book_dict, links in rows:
+                if book_dict is not None:
+                    fragment = _serialize_book(book_dict, sizes)
+                else:
+                    b = _build_book(book, links)
+                    if b is None:
+                        new_row_hashes.pop(canonical_isbn(book['isbn']), None)
+                        continue
+
+                    # Grab the dictionary representation of a book.
+                    book_dict = b.to_dict()
+                    fragment = b.to_json_fragment(sizes)
+
+                for tag in book_dict['tags']:
+                    if not tags.get(tag):
+                        tags[tag] = 1
+                    else:
+                        tags[tag] += 1
+
+                writefile.write(separator)
+                writefile.write(fragment)
+                separator = ',\n'
+                writer.writerow(book_dict)
+
+            writefile.write('\n]')
+    finally:
+        if previous_file is not None:
+            previous_file.close()
+
+    os.rename(tmp_path, BOOKS_JSON_PATH)
+
+    logger.info("%i rows, %i new or changed." % (counts['rows'], counts['changed']))
+    instrument.incr('books.rows', counts['rows'])
+    instrument.incr('books.changed', counts['changed'])
+    _log_field_sizes(sizes)
+
+    with open(BOOKS_MANIFEST_PATH, 'wb') as writefile:
+        writefile.write(json.dumps({
+            'version': _get_books_version(),
+            'tags': _hash_tags(),
+            'rows': new_row_hashes,
+        }))
 
     with open('data/tag-audit.csv', 'w') as f:
         writer = csv.writer(f)
@@ -649,24 +1212,29 @@ def parse_books_csv():
 
 
 @task
-def load_books():
+@instrument.timed
+def load_books(full='false'):
     """
     Loads/reloads just the book data.
     Does not save image files.
+    Only rows changed since the last run are rebuilt, unless run with
+    fab data.load_books:full=true
     """
     logger.info("start load_books")
     logger.info("get books csv")
-    get_books_csv()
+    with instrument.timer('get_books_csv'):
+        get_books_csv()
     logger.info("start parse_books_csv")
-    parse_books_csv()
+    with instrument.timer('parse_books_csv'):
+        parse_books_csv(full=(full == 'true'))
+    fetch.save_cache()
     logger.info("end load_books")
 
 
 def _get_npr_cover_img_url(book):
     """Scrape the URL for a book's cover image from Seamus"""
-    url = 'http://www.npr.org/%s' % book['book_seamus_id']
-    npr_r = requests.get(url)
-    soup = BeautifulSoup(npr_r.content, 'html.parser')
+    url = _get_book_page_url(book['book_seamus_id'])
+    soup = BeautifulSoup(_get_book_page(book['book_seamus_id']), 'html.parser')
     try:
         img = soup.select('.bookedition .image img')[0]
         # The raw HTML includes the URL for a small, low-quality version of
@@ -684,25 +1252,315 @@ def _get_npr_cover_img_url(book):
             url, book['title']))
 
 
+COVER_PATH = 'www/assets/cover'
+TAG_IMAGE_PATH = 'www/assets/tag'
+# Where and when each cover was downloaded. See `load_images`.
+COVERS_MANIFEST_PATH = 'data/covers-manifest.json'
+# Baker and Taylor returns a small placeholder image for unknown ISBNs
+MIN_COVER_SIZE = 10000
+
+# Pillow can only write WebP if it was built with libwebp
+try:
+    from PIL import WebPImagePlugin
+    COVER_WEBP = True
+except ImportError:
+    COVER_WEBP = False
+
+def _fetch_cover(book, secrets, always_use_npr_cover, max_age=None):
+    """
+    Download a book's cover image, reusing a cached download for up to
+    `max_age` seconds.
+
+    Returns the image data, the source it came from and when it was
+    fetched, or None if it couldn't be downloaded.
+    """
+    # Construct the URL with secrets and the ISBN.
+    book_url = "http://imagesa.btol.com/ContentCafe/Jacket.aspx"
+
+    params = {
+        'UserID': secrets['BAKER_TAYLOR_USERID'],
+        'Password': secrets['BAKER_TAYLOR_PASSWORD'],
+        'Value': book['isbn'],
+        'Return': 'T',
+        'Type': 'L'
+    }
+
+    source = 'bakertaylor'
+
+    try:
+        # Request the image.
+        r = fetch.get(book_url, params=params, source='bakertaylor',
+                      max_age=max_age)
+        content = r.content
+
+        use_npr_book_page = (
+                len(content) < MIN_COVER_SIZE or
+                book['isbn'] in always_use_npr_cover
+        )
+        if use_npr_book_page:
+            msg = ('(%s): Image not available from Baker and Taylor, '
+                   'using NPR book page') % book['title']
+            logger.info(msg)
+            try:
+                alt_img_url = _get_npr_cover_img_url(book)
+                msg = 'LOG (%s): Getting alternate image from %s' % (
+                    book['title'], alt_img_url)
+                logger.info(msg)
+                r = fetch.get(alt_img_url, source='npr', max_age=max_age)
+                content = r.content
+                source = 'npr'
+            except ValueError:
+                msg = (
+                    'ERROR (%s): Image not available on NPR book page either'
+                ) % (book['title'])
+                logger.info(msg)
+    except requests.RequestException, e:
+        logger.error('(%s): Could not download cover: %s' % (book['title'], e))
+        return None
+
+    return content, source, r.fetched
+
+def _hash_file(path):
+    """
+    Get the size and SHA-1 hash of a file.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    return len(content), hashlib.sha1(content).hexdigest()
+
+def _is_cover_current(book, entry, max_age):
+    """
+    Check if a previously downloaded cover can be reused.
+    """
+    if entry is None or entry['slug'] != book['slug']:
+        return False
+
+    if max_age is not None and time.time() - entry['fetched'] > max_age:
+        return False
+
+    imagepath = '%s/%s.jpg' % (COVER_PATH, book['slug'])
+
+    try:
+        size, sha1 = _hash_file(imagepath)
+    except IOError:
+        return False
+
+    return (size == entry['size'] and sha1 == entry['sha1'] and
+            _cover_derivatives_exist(book['slug'], entry))
+
+def _cover_derivative_path(slug, width, ext):
+    return '%s/%s-%i.%s' % (COVER_PATH, slug, width, ext)
+
+def _cover_derivatives_exist(slug, entry):
+    """
+    Check that the resized versions of a cover recorded in the manifest
+    are on disk.
+    """
+    if 'widths' not in entry or entry.get('webp') != COVER_WEBP:
+        return False
+
+    exts = ['jpg', 'webp'] if entry['webp'] else ['jpg']
+
+    return all(os.path.exists(_cover_derivative_path(slug, width, ext))
+               for width in entry['widths'] for ext in exts)
+
+def _make_cover_derivatives(image, slug):
+    """
+    Write resized JPEG, and WebP if available, versions of a cover for
+    each of `app_config.COVER_WIDTHS`. Covers are never enlarged, so a
+    narrow cover gets fewer versions.
+
+    Returns the widths that were written.
+    """
+    width, height = image.size
+    widths = sorted(set(min(w, width) for w in app_config.COVER_WIDTHS))
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    for w in widths:
+        resized = image.resize((w, int(round(height * w / float(width)))), Image.ANTIALIAS)
+
+        output = StringIO()
+        resized.save(output, 'JPEG', optimize=True, quality=75)
+        write_atomic(_cover_derivative_path(slug, w, 'jpg'), output.getvalue())
+
+        if COVER_WEBP:
+            output = StringIO()
+            resized.save(output, 'WEBP', quality=75)
+            write_atomic(_cover_derivative_path(slug, w, 'webp'), output.getvalue())
+
+    return widths
+
+def _image_info(image):
+    """
+    Get the dimensions and dominant colour of an image.
+    """
+    width, height = image.size
+
+    sample = image.convert('RGB')
+    sample.thumbnail((50, 50))
+    palette = sample.quantize(colors=8)
+    count, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+
+    return {
+        'width': width,
+        'height': height,
+        'color': '#%02x%02x%02x' % (red, green, blue),
+    }
+
+def _image_file_info(path):
+    """
+    Get the dimensions, dominant colour and byte size of an image file.
+    """
+    info = _image_info(Image.open(path))
+    info['size'] = os.path.getsize(path)
+    return info
+
+def _write_cover_index(books, manifest):
+    """
+    Write metadata for each cover, and each tag image, keyed by slug.
+    """
+    covers = {}
+
+    for book in books:
+        entry = manifest.get(book.get('isbn'))
+        if not entry:
+            continue
+
+        if 'width' not in entry:
+            # Covers downloaded before the index existed
+            imagepath = '%s/%s.jpg' % (COVER_PATH, book['slug'])
+            try:
+                entry.update(_image_info(Image.open(imagepath)))
+            except IOError:
+                continue
+
+        covers[book['slug']] = {
+            'width': entry['width'],
+            'height': entry['height'],
+            'size': entry['size'],
+            'color': entry['color'],
+            'widths': entry.get('widths', []),
+            'webp': entry.get('webp', False),
+        }
+
+    tags = {}
+
+    for path in glob('%s/*.jpg' % TAG_IMAGE_PATH):
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            tags[name] = _image_file_info(path)
+        except IOError:
+            logger.warning('Could not read tag image %s' % path)
+
+    with open(app_config.COVER_INDEX_PATH, 'wb') as writefile:
+        writefile.write(json.dumps({
+            'covers': covers,
+            'tags': tags,
+        }))
+
+def _optimize_cover(imagepath, slug, content, entry):
+    """
+    Recompress a downloaded cover image, write it to www and make its
+    resized versions.
+
+    Runs in a worker process. If the downloaded image is the same one that
+    was optimized into `imagepath` by an earlier run, leaves the files alone.
+    """
+    start = time.time()
+    source_sha1 = hashlib.sha1(content).hexdigest()
+
+    result = {
+        'source_sha1': source_sha1,
+        'original_size': len(content),
+        'skipped': False,
+    }
+
+    if entry and entry.get('source_sha1') == source_sha1:
+        try:
+            size, sha1 = _hash_file(imagepath)
+        except IOError:
+            size, sha1 = None, None
+
+        if ((size, sha1) == (entry['size'], entry['sha1']) and
+                'width' in entry and _cover_derivatives_exist(slug, entry)):
+            result.update(size=size, sha1=sha1, skipped=True,
+                          width=entry['width'], height=entry['height'],
+                          color=entry['color'], widths=entry['widths'],
+                          webp=entry['webp'],
+                          seconds=time.time() - start)
+            return result
+
+    try:
+        image = Image.open(StringIO(content))
+        output = StringIO()
+        image.save(output, 'JPEG', optimize=True, quality=75)
+        optimized = output.getvalue()
+        result.update(_image_info(image))
+        result.update(widths=_make_cover_derivatives(image, slug),
+                      webp=COVER_WEBP)
+    except IOError, e:
+        logger.error('Could not optimize %s: %s' % (imagepath, e))
+        optimized = content
+
+    # Write the image to www using the slug as the filename.
+    write_atomic(imagepath, optimized)
+
+    result.update(size=len(optimized),
+                  sha1=hashlib.sha1(optimized).hexdigest(),
+                  seconds=time.time() - start)
+    return result
+
 @task
-def load_images():
+@instrument.timed
+def load_images(force='false', max_age=None):
     """
     Downloads images from Baker and Taylor.
     Eschews the API for a magic URL pattern, which is faster.
+
+    Covers are downloaded by a pool of threads, and each one is handed to
+    a pool of processes to be recompressed while the rest are still
+    downloading.
+
+    Covers that were already downloaded for a book are skipped, unless run
+    with fab data.load_images:force=true or they are older than `max_age`
+    days, e.g. fab data.load_images:max_age=30. The HTTP cache is then
+    checked with the server too, rather than reused for the source's TTL.
+
+    Books are serialized with their cover sizes, which aren't known until
+    their covers are downloaded, so books with new covers are rebuilt at
+    the end.
     """
+    force = force == 'true'
+    if max_age is not None:
+        max_age = float(max_age) * 24 * 60 * 60
+
+    # Cached downloads older than the covers being replaced aren't reused
+    cache_max_age = 0 if force else max_age
 
     # Secrets.
     secrets = app_config.get_secrets()
 
     # Open the books JSON.
-    with open('www/static-data/books.json', 'rb') as readfile:
+    with open(BOOKS_JSON_PATH, 'rb') as readfile:
         books = json.loads(readfile.read())
 
     print "Start load_images(): %i books." % len(books)
 
     always_use_npr_cover = set(app_config.ALWAYS_USE_NPR_COVER)
 
-    # Loop.
+    try:
+        with open(COVERS_MANIFEST_PATH) as f:
+            previous_manifest = json.load(f)
+    except (IOError, ValueError):
+        previous_manifest = {}
+
+    manifest = {}
+    to_fetch = []
+
     for book in books:
 
         # Skip books with no title or ISBN.
@@ -714,113 +1572,204 @@ def load_images():
             logger.warning('This book has no isbn: %s' % book['title'])
             continue
 
-        # Construct the URL with secrets and the ISBN.
-        book_url = "http://imagesa.btol.com/ContentCafe/Jacket.aspx"
+        entry = previous_manifest.get(book['isbn'])
 
-        params = {
-            'UserID': secrets['BAKER_TAYLOR_USERID'],
-            'Password': secrets['BAKER_TAYLOR_PASSWORD'],
-            'Value': book['isbn'],
-            'Return': 'T',
-            'Type': 'L'
-        }
+        if not force and _is_cover_current(book, entry, max_age):
+            logger.debug('image already downloaded for: %s' % book['slug'])
+            manifest[book['isbn']] = entry
+            continue
 
-        # Request the image.
-        r = requests.get(book_url, params=params)
+        to_fetch.append(book)
 
-        path = 'www/assets/cover'
-        if not os.path.exists(path):
-            os.makedirs(path)
+    print "Fetching %i covers." % len(to_fetch)
+    instrument.incr('covers.current', len(manifest))
 
-        imagepath = '%s/%s.jpg' % (path, book['slug'])
+    if not os.path.exists(COVER_PATH):
+        os.makedirs(COVER_PATH)
 
-        if os.path.exists(imagepath):
-            logger.debug('image already downloaded for: %s' % book['slug'])
+    def _fetch(book):
+        with instrument.timer('fetch_cover', book['slug']):
+            return book, _fetch_cover(book, secrets, always_use_npr_cover,
+                                      cache_max_age)
 
-        # Write the image to www using the slug as the filename.
-        with open(imagepath, 'wb') as writefile:
-            writefile.write(r.content)
+    # Start the processes before any threads, so they aren't forked while
+    # a thread holds a lock.
+    process_pool = Pool(cpu_count())
+    thread_pool = ThreadPool(fetch.DEFAULT_WORKERS)
+    pending = []
 
-        file_size = os.path.getsize(imagepath)
-        use_npr_book_page = (
-                file_size < 10000 or
-                book['isbn'] in always_use_npr_cover
-        )
-        if use_npr_book_page:
-            msg = ('(%s): Image not available from Baker and Taylor, '
-                   'using NPR book page') % book['title']
-            logger.info(msg)
-            try:
-                alt_img_url = _get_npr_cover_img_url(book)
-                msg = 'LOG (%s): Getting alternate image from %s' % (
-                    book['title'], alt_img_url)
-                logger.info(msg)
-                alt_img_resp = requests.get(alt_img_url)
-                with open(imagepath, 'wb') as writefile:
-                    writefile.write(alt_img_resp.content)
-            except ValueError:
-                msg = (
-                    'ERROR (%s): Image not available on NPR book page either'
-                ) % (book['title'])
-                logger.info(msg)
+    try:
+        for book, result in thread_pool.imap_unordered(_fetch, to_fetch):
+            if not result:
+                continue
+
+            content, source, fetched = result
+            imagepath = '%s/%s.jpg' % (COVER_PATH, book['slug'])
+            entry = previous_manifest.get(book['isbn'])
+            pending.append((book, source, fetched, process_pool.apply_async(
+                _optimize_cover, (imagepath, book['slug'], content, entry))))
+
+        optimized = 0
+        bytes_saved = 0
 
-        image = Image.open(imagepath)
-        image.save(imagepath, optimize=True, quality=75)
+        for book, source, fetched, async_result in pending:
+            result = async_result.get()
+            instrument.record('optimize_cover', result['seconds'], book['slug'])
+
+            if result['skipped']:
+                logger.debug('%s: already optimized' % book['slug'])
+            else:
+                saved = result['original_size'] - result['size']
+                optimized += 1
+                bytes_saved += saved
+                logger.debug('%s: optimized in %.3fs, saved %i bytes' % (
+                    book['slug'], result['seconds'], saved))
+
+            manifest[book['isbn']] = {
+                'slug': book['slug'],
+                'source': source,
+                'size': result['size'],
+                'sha1': result['sha1'],
+                'source_sha1': result['source_sha1'],
+                'fetched': fetched,
+            }
 
+            if 'width' in result:
+                manifest[book['isbn']].update(
+                    width=result['width'],
+                    height=result['height'],
+                    color=result['color'],
+                    widths=result['widths'],
+                    webp=result['webp'])
+
+        logger.info('Optimized %i covers, saved %i bytes' % (
+            optimized, bytes_saved))
+        instrument.incr('covers.fetched', len(pending))
+        instrument.incr('covers.optimized', optimized)
+        instrument.incr('covers.bytes_saved', bytes_saved)
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+        process_pool.close()
+        process_pool.join()
+
+    _write_cover_index(books, manifest)
+
+    with open(COVERS_MANIFEST_PATH, 'wb') as writefile:
+        writefile.write(json.dumps(manifest))
+
+    # Only the rows whose cover metadata changed are rebuilt, see `_hash_row`
+    if pending:
+        logger.info('Rebuilding books with new covers')
+        with instrument.timer('parse_books_csv'):
+            parse_books_csv()
+
+    fetch.save_cache()
     logger.info("Load Images End.")
 
 
+def _make_mosaic_tile(args):
+    """
+    Decode and resize a cover for the promotion image.
+
+    Runs in a worker process. With `draft`, JPEG draft mode decodes the
+    cover at the smallest scale that is still larger than the tile. This
+    is much faster, but changes the resampling, so the pixels differ
+    slightly from a full decode.
+    """
+    path, size, draft = args
+    image = Image.open(path)
+    if draft:
+        image.draft('RGB', size)
+    image = image.convert('RGB').resize(size, Image.ANTIALIAS)
+    return image.tobytes()
+
 @task
-def make_promotion_thumb():
+@instrument.timed
+def make_promotion_thumb(draft='false'):
+    """
+    Make a mosaic of covers to promote the app.
+
+    The layout is worked out from the cover dimensions first, so only the
+    covers that end up in the cropped image are decoded, in parallel, and
+    pasted into a canvas of the final size.
+
+    Pass `draft=true` to decode covers at reduced size, which is faster
+    but gives slightly different pixels.
+    """
+    draft = draft.lower() == 'true'
     images_per_column = TOTAL_IMAGES / IMAGE_COLUMNS
     image_width = PROMOTION_IMAGE_WIDTH / IMAGE_COLUMNS
     max_height = int(image_width * images_per_column * 1.5)
-    image = Image.new('RGB', [PROMOTION_IMAGE_WIDTH, max_height])
 
     # Open the books JSON.
-    with open('www/static-data/books.json', 'rb') as readfile:
+    with open(BOOKS_JSON_PATH, 'rb') as readfile:
         books = json.loads(readfile.read())
 
-    coordinates = [0, 0]
-    last_y = 0
-    total_height = 0
-    min_height = None
-    column_multiplier = 0
+    get_cover_index()
+
+    tiles = []
+    column_heights = []
 
     for i, book in enumerate(books[:TOTAL_IMAGES]):
         if i % images_per_column == 0:
-            if not min_height or total_height < min_height:
-                min_height = total_height
-            coordinates[0] = column_multiplier * image_width
-            coordinates[1] = 0
-            last_y = 0
-            column_multiplier +=1
-            total_height = 0
-
-        path = 'www/assets/cover/%s.jpg' % book['slug']
-        book_image = Image.open(path)
-        width, height = book_image.size
+            column_heights.append(0)
+
+        path = '%s/%s.jpg' % (COVER_PATH, book['slug'])
+        cover = COVER_INDEX.get(book['slug'])
+        if cover:
+            width, height = cover['width'], cover['height']
+        else:
+            # Only reads the image header
+            width, height = Image.open(path).size
         ratio = width / float(image_width)
         new_height = int(height / ratio)
-        resized = book_image.resize((image_width, new_height), Image.ANTIALIAS)
-        coordinates[1] = coordinates[1] + last_y
-        image.paste(resized, tuple(coordinates))
-        last_y = new_height
-        total_height += new_height
+        column = len(column_heights) - 1
+        tiles.append((path, column * image_width, column_heights[column], new_height))
+        column_heights[column] += new_height
 
-    if min_height is None:
+    if not column_heights:
         logger.warn("Minimum height not detected.  This is likely because "
                     "no images were loaded. Skipping generation of promotion "
                     "thumbnail image.")
         return
 
+    # The last column is usually short, so it doesn't count
+    min_height = min(column_heights[:-1]) if len(column_heights) > 1 else 0
+
     min_prop_width = min_height * 16 / float(9)
     # Make the proportion fit the highest full thumbnail width
     # that complies with the proportion
     final_width = int(min_prop_width / image_width) * image_width
-    cropped = image.crop((0, 0, final_width, min_height))
+    image = Image.new('RGB', [final_width, min_height])
+
+    # Covers are only drawn within the full-size canvas
+    visible_width = min(final_width, PROMOTION_IMAGE_WIDTH)
+    visible_height = min(min_height, max_height)
+    visible = [tile for tile in tiles
+               if tile[1] < visible_width and tile[2] < visible_height]
+
+    pool = Pool(cpu_count())
+    try:
+        resized_tiles = pool.imap(
+            _make_mosaic_tile,
+            [(path, (image_width, new_height), draft) for path, x, y, new_height in visible],
+            chunksize=8)
+
+        for (path, x, y, new_height), data in zip(visible, resized_tiles):
+            resized = Image.frombytes('RGB', (image_width, new_height), data)
+            if y + new_height > visible_height:
+                resized = resized.crop((0, 0, image_width, visible_height - y))
+            image.paste(resized, (x, y))
+    finally:
+        pool.close()
+        pool.join()
+
+    if visible_width < final_width:
+        image.paste((0, 0, 0), (visible_width, 0, final_width, min_height))
+
     # via http://stackoverflow.com/questions/1405602/how-to-adjust-the-quality-of-a-resized-image-in-python-imaging-library
-    cropped.save('www/assets/img/covers.jpg', quality=95)
+    image.save('www/assets/img/covers.jpg', quality=95)
 
 @task
 def get_books_itunes_ids(input_filename=os.path.join('data', 'books.csv'),
@@ -839,30 +1788,32 @@ def get_books_itunes_ids(input_filename=os.path.join('data', 'books.csv'),
     with open(input_filename) as readfile:
         reader = CSVKitDictReader(readfile, encoding='utf-8')
         reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        # Note that we don't create Book objects because the
+        # parsing/lookup takes too long and we only need to lookup the
+        # iTunes ID.
+        books = list(reader)
 
-        with open(output_filename, 'wb') as fout:
-            writer = CSVKitDictWriter(fout, fieldnames=fieldnames)
-            writer.writeheader()
+    # Requests are throttled to the API limit in `fetch.RATE_LIMITS`
+    itunes_ids = Book.lookup_itunes_ids(
+        [(book['isbn'], book['title']) for book in books])
 
-            for book in reader:
-                # Note that we don't create Book objects because the
-                # parsing/lookup takes too long and we only need to lookup the
-                # iTunes ID.
+    with open(output_filename, 'wb') as fout:
+        writer = CSVKitDictWriter(fout, fieldnames=fieldnames)
+        writer.writeheader()
 
-                output_book = {k: book[k] for k in fieldnames}
+        for book in books:
+            output_book = {k: book[k] for k in fieldnames}
 
-                if book['title']:
+            if book['title']:
+                isbn = book['isbn'].strip()
+                if isbn:
+                    output_book['itunes_id'] = itunes_ids.get(isbn)
+                else:
                     output_book['itunes_id'] = Book.get_itunes_id(book['title'])
 
-                writer.writerow(output_book)
+            writer.writerow(output_book)
 
-                # We have to wait to avoid API throttling.  According to
-                # the Enterprise Partner Feed documentation, the limit is ~20
-                # calls per minute.  See
-                # https://affiliate.itunes.apple.com/resources/documentation/itunes-enterprise-partner-feed/
-                # I had previously tried a sleep time of 5 and many requests
-                # failed
-                time.sleep(10)
+    fetch.save_cache()
 
 @task
 def get_book_itunes_id(title):
@@ -876,12 +1827,41 @@ def get_book_itunes_id(title):
     """
     print(Book.get_itunes_id(title))
 
+def _load_goodreads_journal(path):
+    """
+    Read the Goodreads IDs resolved by previous sweeps.
+
+    The journal has one JSON object per line.  Later lines win, and a
+    truncated last line from an interrupted sweep is ignored.
+    """
+    goodreads_ids = {}
+
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning('Ignoring corrupt line in %s' % path)
+                    continue
+                goodreads_ids[entry['isbn']] = entry['goodreads_id']
+    except IOError:
+        pass
+
+    return goodreads_ids
+
 @task
 def get_books_goodreads_ids(input_filename=os.path.join('data', 'books.csv'),
-        output_filename=os.path.join('data', 'goodreads_ids.csv')):
+        output_filename=os.path.join('data', 'goodreads_ids.csv'),
+        force='false'):
     """
     Retrieve GoodReads slugs corresponding to books in the books spreadsheet.
 
+    Each lookup is appended to a journal as it finishes, so an interrupted
+    sweep picks up where it left off.  Only ISBNs that are new, or that
+    weren't found before, are looked up unless `force` is 'true'.  Those
+    that weren't found before, and every ISBN when forced, are checked
+    with Goodreads again rather than answered from the HTTP cache.
     """
     fieldnames = [
         # Only include enough fields to identify the book
@@ -893,23 +1873,58 @@ def get_books_goodreads_ids(input_filename=os.path.join('data', 'books.csv'),
     with open(input_filename) as readfile:
         reader = CSVKitDictReader(readfile, encoding='utf-8')
         reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        books = list(reader)
 
-        with open(output_filename, 'wb') as fout:
-            writer = CSVKitDictWriter(fout, fieldnames=fieldnames)
-            writer.writeheader()
+    force = force == 'true'
+    if force:
+        goodreads_ids = {}
+    else:
+        goodreads_ids = _load_goodreads_journal(GOODREADS_JOURNAL_PATH)
 
-            for book in reader:
+    isbns = []
+    for book in books:
+        isbn = book['isbn'].strip()
+        if isbn and not goodreads_ids.get(isbn) and isbn not in isbns:
+            isbns.append(isbn)
+
+    logger.info('Looking up %i of %i ISBNs' % (len(isbns), len(books)))
+
+    # Requests are throttled to the API limit in `fetch.RATE_LIMITS`
+    with open(GOODREADS_JOURNAL_PATH, 'a') as journal:
+        for isbn in isbns:
+            # Retry lookups that failed before
+            max_age = 0 if force or isbn in goodreads_ids else None
+
+            try:
+                goodreads_ids[isbn] = Book.get_goodreads_id(isbn, max_age)
+            except requests.RequestException, e:
+                logger.warning('Could not look up ISBN %s: %s' % (isbn, e))
+                continue
+
+            journal.write(json.dumps({
+                'isbn': isbn,
+                'goodreads_id': goodreads_ids[isbn],
+            }) + '\n')
+            journal.flush()
+
+    # Compact the journal down to the latest entry for each ISBN
+    write_atomic(GOODREADS_JOURNAL_PATH, ''.join(
+        json.dumps({'isbn': isbn, 'goodreads_id': goodreads_id}) + '\n'
+        for isbn, goodreads_id in sorted(goodreads_ids.items())))
+
+    with open(output_filename, 'wb') as fout:
+        writer = CSVKitDictWriter(fout, fieldnames=fieldnames)
+        writer.writeheader()
 
-                output_book = {'title': book['title'], 'isbn': book['isbn'], 'goodreads_id': ''}
+        for book in books:
+            output_book = {'title': book['title'], 'isbn': book['isbn'], 'goodreads_id': ''}
 
-                if book['isbn']:
-                    output_book['goodreads_id'] = Book.get_goodreads_id(book['isbn'])
+            if book['isbn']:
+                output_book['goodreads_id'] = goodreads_ids.get(book['isbn'].strip())
 
-                writer.writerow(output_book)
+            writer.writerow(output_book)
 
-                # According to the Goodreads API documenation (https://www.goodreads.com/api/terms)
-                # the rate limit is 1 request per second.
-                time.sleep(2)
+    fetch.save_cache()
 
 @task
 def get_book_goodreads_id(isbn):
@@ -15,9 +15,10 @@ import logging
 import os
 
 from csvkit.py2 import CSVKitDictReader, CSVKitDictWriter
-import requests
 
 import app_config
+import fetch
+from isbn import ISBNIndex
 
 
 logging.basicConfig(format=app_config.LOG_FORMAT)
@@ -53,7 +54,7 @@ def get_station_coverage_csv(output_path=DEFAULT_STATION_COVERAGE_CSV_PATH):
     """
     csv_url = 'https://docs.google.com/spreadsheets/d/e/%s/pub?gid=0&single=true&output=csv' % (
         app_config.STATION_COVERAGE_GOOGLE_DOC_KEY)
-    r = requests.get(csv_url)
+    r = fetch.get(csv_url, source='gdocs')
     if r.headers['content-type'] != 'text/csv':
         logger.error('Unexpected Content-type: %s. Are you sure the spreadsheet is published as csv?' % r.headers['content-type'])
     else:
@@ -104,7 +105,7 @@ def get_link_title(url):
         str: Title from HTML document's `<title>` tag.
 
     """
-    r = requests.get(url)
+    r = fetch.get(url, source='station')
     parser = TitleHTMLParser()
     parser.feed(r.text)
     return parser.title
@@ -179,6 +180,8 @@ def get_station_coverage_headlines(csv_path=DEFAULT_STATION_COVERAGE_CSV_PATH,
                     output_row[headline_key] = get_link_title(url)
                 writer.writerow(output_row)
 
+    fetch.save_cache()
+
 
 def parse_station_coverage_csv(csv_path=DEFAULT_STATION_COVERAGE_CSV_PATH,
                                json_path=DEFAULT_EXTERNAL_LINKS_JSON_PATH,
@@ -225,21 +228,7 @@ def parse_station_coverage_csv(csv_path=DEFAULT_STATION_COVERAGE_CSV_PATH,
             writefile.write(json.dumps(external_links_by_isbn))
 
 
-def get_isbn_choices(isbn):
-    choices = [isbn]
-
-    padded = '{:0<10}'.format(isbn)
-    if padded != isbn:
-        choices.append(padded)
-
-    stripped = isbn.lstrip('0')
-    if stripped != isbn:
-        choices.append(stripped)
-
-    return choices
-
-
-def lookup_links_by_isbn(isbn, lookup):
+def lookup_links_by_isbn(isbn, lookup, index=None):
     """
     Retrieve links for a book by ISBN.
 
@@ -249,16 +238,18 @@ def lookup_links_by_isbn(isbn, lookup):
         isbn (str): ISBN code for a book.
         lookup (dict): Lookup table where keys are ISBNs and values are lists
             of HTML links.
+        index (ISBNIndex): Index of the keys of `lookup`.  Pass one in when
+            looking up many books.
 
     """
-    isbn_choices = get_isbn_choices(isbn)
-    for isbn_choice in isbn_choices:
-        try:
-            return lookup[isbn_choice], isbn_choice
-        except KeyError:
-            pass
+    if index is None:
+        index = ISBNIndex(lookup)
+
+    matching_isbn = index.get(isbn)
+    if matching_isbn is None:
+        raise KeyError("ISBN %s not found" % (isbn))
 
-    raise KeyError("ISBN %s not found" % (isbn))
+    return lookup[matching_isbn], matching_isbn
 
 
 def merge_external_links(books_csv_path=DEFAULT_BOOKS_CSV,
@@ -286,6 +277,7 @@ def merge_external_links(books_csv_path=DEFAULT_BOOKS_CSV,
     ]
     with open(links_json_path) as jsonf:
         lookup = json.load(jsonf)
+        index = ISBNIndex(lookup)
         matched = set()
 
         with open(books_csv_path) as readfile:
@@ -306,7 +298,7 @@ def merge_external_links(books_csv_path=DEFAULT_BOOKS_CSV,
 
                     if book['isbn']:
                         try:
-                            links, matching_isbn = lookup_links_by_isbn(book['isbn'], lookup)
+                            links, matching_isbn = lookup_links_by_isbn(book['isbn'], lookup, index)
                             output_book['external_links_html'] = ','.join(links)
                             matched.add(matching_isbn)
                         except KeyError:
@@ -317,6 +309,5 @@ def merge_external_links(books_csv_path=DEFAULT_BOOKS_CSV,
 
             # Do an audit to see if there are any ISBNs in the member station
             # responses that didn't match books.
-            for isbn in lookup:
-                if isbn not in matched:
-                    logger.warn("No matching book found for ISBN %s" % (isbn))
+            for isbn in sorted(set(lookup) - matched):
+                logger.warn("No matching book found for ISBN %s" % (isbn))
@@ -0,0 +1,358 @@
+"""
+Helpers for making HTTP requests from the data commands.
+
+All requests share a single keep-alive `requests.Session` so that
+connections to the same host are reused, and each host is limited to a
+small number of requests in flight at once so that we can fetch
+concurrently without hammering the upstream servers.  Sources with an API
+rate limit also share a token bucket, so requests are spaced out only as
+much as the limit requires.
+
+Responses are kept in an on-disk cache (see `http_cache`).  Each request
+names the source it comes from, and a cached response is used without
+contacting the server until the source's TTL, or the request's `max_age`
+if it's shorter, has passed.  After that it is revalidated with a
+conditional request.  In offline mode, only cached responses are used.
+
+"""
+
+import atexit
+from collections import deque
+import logging
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+import time
+from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+import app_config
+from http_cache import HTTPCache
+import instrument
+
+
+logging.basicConfig(format=app_config.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(app_config.LOG_LEVEL)
+
+
+# Number of worker threads used when fetching many URLs at once.
+DEFAULT_WORKERS = 8
+# Maximum number of requests in flight to any single host.
+HOST_CONCURRENCY = 4
+# Seconds to wait for a server to respond before giving up.
+DEFAULT_TIMEOUT = 30
+# Number of times to retry a request that fails or gets a server error,
+# waiting RETRY_BACKOFF seconds before the first retry and twice as long
+# before each one after that.
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 1
+
+HTTP_CACHE_PATH = os.path.join('data', 'http-cache')
+HTTP_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# How long, in seconds, a cached response is used without revalidating
+# it, by source.  Sources not listed here are always revalidated.
+HTTP_CACHE_TTLS = {
+    'npr': 24 * 60 * 60,
+    'bakertaylor': 7 * 24 * 60 * 60,
+    'itunes_lookup': 7 * 24 * 60 * 60,
+    'itunes_search': 7 * 24 * 60 * 60,
+    'goodreads': 30 * 24 * 60 * 60,
+    'station': 30 * 24 * 60 * 60,
+    'gdocs': 0,
+}
+
+# Maximum request rate, in requests per second, and burst size, by source.
+# Cached responses don't count against the limit.
+RATE_LIMITS = {
+    # According to the Enterprise Partner Feed documentation, the limit is
+    # ~20 calls per minute.  See
+    # https://affiliate.itunes.apple.com/resources/documentation/itunes-enterprise-partner-feed/
+    'itunes_lookup': (20 / 60.0, 1),
+    # The search API is stricter.  Titles used to be searched 10 seconds
+    # apart: "I had previously tried a sleep time of 5 and many requests
+    # failed"
+    'itunes_search': (6 / 60.0, 1),
+    # According to the Goodreads API documenation
+    # (https://www.goodreads.com/api/terms) the rate limit is 1 request per
+    # second.
+    'goodreads': (1, 1),
+}
+
+# Status codes servers use to reject requests over their rate limit
+THROTTLED_STATUS_CODES = (403, 429)
+
+# When True, only use cached responses.  See `fab data.offline`.
+OFFLINE = False
+
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=DEFAULT_WORKERS,
+                                     pool_maxsize=DEFAULT_WORKERS))
+SESSION.mount('https://', HTTPAdapter(pool_connections=DEFAULT_WORKERS,
+                                      pool_maxsize=DEFAULT_WORKERS))
+
+CACHE = HTTPCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_BYTES)
+atexit.register(CACHE.save)
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class OfflineError(requests.RequestException):
+    """
+    Raised when a response is needed that isn't in the cache while running
+    in offline mode.
+    """
+    pass
+
+
+def _host_semaphore(url):
+    """
+    Get the semaphore that limits concurrent requests to a URL's host.
+    """
+    host = urlparse(url).netloc
+
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(
+                HOST_CONCURRENCY)
+
+        return _host_semaphores[host]
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens are added at `rate` per second, up to `capacity`.  Each request
+    takes one token, waiting for it if the bucket is empty.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, blocking until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.capacity,
+                    self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def _rate_limiter(source):
+    """
+    Get the token bucket for a source, or None if it isn't rate limited.
+    """
+    if source not in RATE_LIMITS:
+        return None
+
+    with _rate_limiters_lock:
+        if source not in _rate_limiters:
+            _rate_limiters[source] = TokenBucket(*RATE_LIMITS[source])
+
+        return _rate_limiters[source]
+
+
+def _cached_response(url, entry, content):
+    """
+    Build a response object from a cache entry.
+    """
+    response = requests.Response()
+    response.url = url
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict()
+    if entry.get('content_type'):
+        response.headers['content-type'] = entry['content_type']
+    response._content = content
+    response.from_cache = True
+    response.fetched = entry['fetched']
+    return response
+
+
+def _request(url, headers, timeout, retries, source=None):
+    """
+    Make a GET request, retrying with exponential backoff.
+    """
+    attempt = 0
+    limiter = _rate_limiter(source)
+
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+
+        instrument.incr('http.requests')
+        instrument.incr('http.requests.%s' % source)
+
+        try:
+            with _host_semaphore(url):
+                r = SESSION.get(url, headers=headers, timeout=timeout)
+            if limiter is not None and r.status_code in THROTTLED_STATUS_CODES:
+                logger.warning('Throttled by %s (HTTP %i): %s' % (source, r.status_code, url))
+                instrument.incr('http.throttled')
+                instrument.incr('http.throttled.%s' % source)
+            if r.status_code < 500 or attempt >= retries:
+                return r
+        except requests.RequestException, e:
+            if attempt >= retries:
+                instrument.incr('http.errors')
+                raise
+            logger.info('Retrying %s after error: %s' % (url, e))
+
+        instrument.incr('http.retries')
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        attempt += 1
+
+
+def get(url, params=None, source=None, timeout=DEFAULT_TIMEOUT,
+        retries=DEFAULT_RETRIES, max_age=None):
+    """
+    Make a GET request using the shared session and the HTTP cache.
+
+    Args:
+        url (str): URL to request.
+        params (dict): Optional query string parameters.
+        source (str): Name of the upstream source, used to look up the TTL
+            in `HTTP_CACHE_TTLS`.
+        timeout (int): Seconds to wait for the server to respond.
+        retries (int): Number of times to retry failed requests.
+        max_age (float): Seconds a cached response can be used without
+            revalidating it, if less than the source's TTL.  Pass 0 to
+            always check with the server.
+
+    Returns:
+        requests.Response: The response.  Only successful responses are
+        cached.  Its `fetched` attribute is the time the content was last
+        fetched or revalidated.
+
+    """
+    full_url = requests.Request('GET', url, params=params).prepare().url
+    entry, content = CACHE.get(full_url)
+
+    ttl = HTTP_CACHE_TTLS.get(source, 0)
+    if max_age is not None:
+        ttl = min(ttl, max_age)
+
+    if entry is not None:
+        age = time.time() - entry['fetched']
+        if OFFLINE or age < ttl:
+            instrument.incr('http.cache_hits')
+            return _cached_response(full_url, entry, content)
+    elif OFFLINE:
+        raise OfflineError('%s is not cached' % full_url)
+
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        r = _request(full_url, headers, timeout, retries, source)
+    except requests.RequestException, e:
+        if entry is None:
+            raise
+        logger.warning('Using stale cached response for %s: %s' % (url, e))
+        return _cached_response(full_url, entry, content)
+
+    if r.status_code == 304 and entry is not None:
+        instrument.incr('http.not_modified')
+        CACHE.touch(full_url, revalidated=True)
+        return _cached_response(full_url, entry, content)
+
+    instrument.incr('http.bytes', len(r.content))
+
+    if r.status_code == 200:
+        CACHE.put(full_url, r.content, source=source, headers=r.headers)
+
+    r.from_cache = False
+    r.fetched = time.time()
+    return r
+
+
+def save_cache():
+    """
+    Write the HTTP cache index to disk.
+    """
+    CACHE.save()
+
+
+def map_concurrent(func, items, workers=DEFAULT_WORKERS):
+    """
+    Call a function for each item using a pool of threads.
+
+    Args:
+        func (function): Function to call with each item.
+        items (list): Items to process.
+        workers (int): Number of worker threads.
+
+    Returns:
+        list: Results of calling `func`, in the same order as `items`.
+
+    """
+    if not items:
+        return []
+
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def imap_bounded(func, items, workers=DEFAULT_WORKERS, maxsize=None):
+    """
+    Lazily call a function for each item using a pool of threads.
+
+    Unlike `ThreadPool.imap`, items are only read from the iterable as
+    results are consumed, so at most `maxsize` items are in flight at once.
+
+    Args:
+        func (function): Function to call with each item.
+        items (iterable): Items to process.
+        workers (int): Number of worker threads.
+        maxsize (int): Maximum number of items in flight.  Defaults to
+            twice the number of workers.
+
+    Yields:
+        Results of calling `func`, in the same order as `items`.
+
+    """
+    maxsize = maxsize or workers * 2
+    pending = deque()
+    pool = ThreadPool(workers)
+
+    try:
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= maxsize:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.close()
+        pool.join()
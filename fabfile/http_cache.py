@@ -0,0 +1,239 @@
+"""
+On-disk cache for HTTP responses.
+
+Response bodies are stored by the SHA-1 of their content, so identical
+responses (for example the same cover image for two ISBNs) are only
+stored once.  An index maps the SHA-1 of each request URL to the stored
+body along with the validators (`ETag` and `Last-Modified`) needed to
+revalidate it with a conditional request.
+
+"""
+
+from glob import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import app_config
+from utils import write_atomic
+
+
+logging.basicConfig(format=app_config.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(app_config.LOG_LEVEL)
+
+
+class HTTPCache(object):
+    """
+    A size-bounded store of HTTP responses, evicted least recently used
+    first.
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(path, 'index.json')
+        self._lock = threading.Lock()
+        self._index = None
+        # Number of entries using each stored body, by SHA-1
+        self._refs = {}
+        self._dirty = False
+        # Objects older than this that no entry uses are left over from
+        # earlier runs, and are deleted by `save`
+        self._created = time.time()
+
+    def _load(self):
+        if self._index is not None:
+            return
+
+        try:
+            with open(self._index_path, 'rb') as f:
+                self._index = json.load(f)
+        except IOError:
+            self._index = {}
+        except ValueError:
+            logger.warning('Ignoring corrupt HTTP cache index %s' % self._index_path)
+            self._index = {}
+
+        for entry in self._index.itervalues():
+            self._ref(entry['sha1'])
+
+    def _key(self, url):
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        return hashlib.sha1(url).hexdigest()
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def _remove_object(self, digest):
+        try:
+            os.remove(self._object_path(digest))
+        except OSError:
+            pass
+
+    def _ref(self, digest):
+        self._refs[digest] = self._refs.get(digest, 0) + 1
+
+    def _unref(self, digest):
+        """
+        Drop a reference to a stored body, and delete the body if no entry
+        uses it any more.  Must be called with the lock held.
+        """
+        self._refs[digest] -= 1
+
+        if not self._refs[digest]:
+            del self._refs[digest]
+            self._remove_object(digest)
+
+    def get(self, url):
+        """
+        Get the cache entry and body for a URL.
+
+        Returns:
+            tuple: The entry dict and the body, or `(None, None)` if the URL
+            is not cached.
+
+        """
+        key = self._key(url)
+
+        with self._lock:
+            self._load()
+            entry = self._index.get(key)
+
+        if entry is None:
+            return None, None
+
+        try:
+            with open(self._object_path(entry['sha1']), 'rb') as f:
+                content = f.read()
+        except IOError:
+            with self._lock:
+                if self._index.get(key) is entry:
+                    del self._index[key]
+                    self._unref(entry['sha1'])
+                    self._dirty = True
+            return None, None
+
+        self.touch(url)
+
+        return entry, content
+
+    def touch(self, url, revalidated=False):
+        """
+        Mark an entry as recently used, and optionally as freshly
+        revalidated against the server.
+        """
+        key = self._key(url)
+        now = time.time()
+
+        with self._lock:
+            self._load()
+            entry = self._index.get(key)
+            if entry is None:
+                return
+            entry['accessed'] = now
+            if revalidated:
+                entry['fetched'] = now
+            self._dirty = True
+
+    def put(self, url, content, source=None, headers=None):
+        """
+        Store the body and validators of a response.
+        """
+        headers = headers or {}
+        digest = hashlib.sha1(content).hexdigest()
+        object_path = self._object_path(digest)
+
+        if not os.path.exists(object_path):
+            write_atomic(object_path, content)
+
+        now = time.time()
+        entry = {
+            'sha1': digest,
+            'size': len(content),
+            'source': source,
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'content_type': headers.get('content-type'),
+            'fetched': now,
+            'accessed': now,
+        }
+
+        with self._lock:
+            self._load()
+            old_entry = self._index.get(self._key(url))
+            self._index[self._key(url)] = entry
+            self._ref(digest)
+            self._dirty = True
+
+            # Delete the old body when the URL's content changes, unless
+            # another URL has the same body
+            if old_entry is not None:
+                self._unref(old_entry['sha1'])
+
+        return entry
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the stored bodies fit in
+        `max_bytes`.  Must be called with the lock held.
+        """
+        sizes = {}
+        for entry in self._index.itervalues():
+            sizes[entry['sha1']] = entry['size']
+
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['accessed'])
+
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+
+            del self._index[key]
+
+            if self._refs[entry['sha1']] == 1:
+                total -= entry['size']
+            self._unref(entry['sha1'])
+
+        logger.info('Evicted HTTP cache entries down to %i bytes' % total)
+
+    def _sweep(self):
+        """
+        Delete stored bodies that no entry uses, such as the bodies left
+        behind by earlier runs when a URL's content changed.  Must be called
+        with the lock held.
+        """
+        for object_path in glob(os.path.join(self.path, 'objects', '*', '*')):
+            digest = os.path.basename(object_path)
+
+            if digest in self._refs or digest.endswith('.tmp'):
+                continue
+
+            # Bodies written since this cache was opened may belong to a
+            # `put` that hasn't updated the index yet
+            try:
+                if os.path.getmtime(object_path) >= self._created:
+                    continue
+            except OSError:
+                continue
+
+            self._remove_object(digest)
+
+    def save(self):
+        """
+        Evict old entries, delete unused bodies and write the index to disk.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+
+            self._evict()
+            self._sweep()
+            write_atomic(self._index_path, json.dumps(self._index))
+            self._dirty = False
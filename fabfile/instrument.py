@@ -0,0 +1,168 @@
+"""
+Timers and counters for reporting where a data run spends its time.
+
+Stages are timed with nested `timer()` blocks, e.g. `update/load_books`,
+and the books or covers inside a stage with `timer()` blocks that name
+an item.  Counters record things like the number of HTTP requests and
+bytes downloaded.  At the end of a run, `write_report()` writes
+everything to a JSON file and logs a summary table, so runs can be
+compared to spot regressions.
+
+Stages are expected to run one after another in the main thread.  Item
+timers can be used from worker threads, and are recorded under the stage
+that is running.
+
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import json
+import logging
+import threading
+import time
+
+import app_config
+from utils import write_atomic
+
+
+logging.basicConfig(format=app_config.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(app_config.LOG_LEVEL)
+
+
+# Number of slowest items listed for each timer in the summary table
+SLOWEST_ITEMS = 5
+
+_lock = threading.Lock()
+_stack = []
+_timers = {}
+_counters = {}
+_started = [time.time()]
+
+
+def reset():
+    """
+    Forget everything recorded so far and start a new run.
+    """
+    with _lock:
+        del _stack[:]
+        _timers.clear()
+        _counters.clear()
+        _started[0] = time.time()
+
+
+def _path(name):
+    return '/'.join(_stack + [name])
+
+
+def record(name, seconds, item=None):
+    """
+    Record a time for a timer under the current stage.
+    """
+    with _lock:
+        stats = _timers.setdefault(_path(name), {
+            'count': 0,
+            'seconds': 0.0,
+            'min': None,
+            'max': 0.0,
+            'items': {},
+        })
+        stats['count'] += 1
+        stats['seconds'] += seconds
+        stats['min'] = seconds if stats['min'] is None else min(stats['min'], seconds)
+        stats['max'] = max(stats['max'], seconds)
+        if item is not None:
+            stats['items'][item] = stats['items'].get(item, 0) + seconds
+
+
+@contextmanager
+def timer(name, item=None):
+    """
+    Time a block of code.
+
+    Without an `item`, the block is a stage, and timers inside it are
+    nested under its name.  With an `item`, such as a book's slug, the
+    time is recorded for that item and nothing is nested under it.
+    """
+    if item is None:
+        with _lock:
+            _stack.append(name)
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        seconds = time.time() - start
+        if item is None:
+            with _lock:
+                _stack.pop()
+        record(name, seconds, item)
+
+
+def timed(func):
+    """
+    Decorator that runs a function as a stage named after the function.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with timer(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def incr(name, value=1):
+    """
+    Add to a counter.
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get_report():
+    """
+    Get everything recorded in this run.
+    """
+    with _lock:
+        timers = {}
+        for path, stats in _timers.items():
+            timers[path] = dict(stats, items=dict(stats['items']))
+
+        return {
+            'started': datetime.fromtimestamp(_started[0]).isoformat(),
+            'seconds': time.time() - _started[0],
+            'timers': timers,
+            'counters': dict(_counters),
+        }
+
+
+def format_summary(report):
+    """
+    Format a report as a table of timers followed by counters.
+    """
+    lines = ['%-48s %8s %10s %10s' % ('timer', 'count', 'seconds', 'max')]
+
+    for path in sorted(report['timers']):
+        stats = report['timers'][path]
+        lines.append('%-48s %8i %10.2f %10.2f' % (
+            path, stats['count'], stats['seconds'], stats['max']))
+
+        slowest = sorted(stats['items'].items(), key=lambda item: -item[1])
+        for item, seconds in slowest[:SLOWEST_ITEMS]:
+            lines.append('    %-44s %8s %10.2f' % (item[:44], '', seconds))
+
+    for name in sorted(report['counters']):
+        lines.append('%-48s %8i' % (name, report['counters'][name]))
+
+    return '\n'.join(lines)
+
+
+def write_report(path):
+    """
+    Write the run report to a JSON file and log a summary.
+    """
+    report = get_report()
+    write_atomic(path, json.dumps(report, indent=2, sort_keys=True))
+    logger.info('Run report written to %s\n%s' % (path, format_summary(report)))
+    return report
@@ -0,0 +1,102 @@
+"""
+Helpers for matching books by ISBN.
+
+The same book shows up under different forms of its ISBN: the books
+spreadsheet mostly uses ISBN-10, station coverage submissions use
+ISBN-10 or ISBN-13, spreadsheets drop leading zeros and people type
+hyphens.  Ebooks without an ISBN use their ASIN instead.
+
+`canonical_isbn()` reduces all of these to a single key, so books can be
+joined with a dictionary lookup.
+
+"""
+
+import re
+
+
+ISBN10_REGEX = re.compile(r'^\d{9}[\dX]$')
+
+
+def to_isbn13(value):
+    """
+    Calculate ISBN-13, see: http://www.ehow.com/how_5928497_convert-10-digit-isbn-13.html
+    """
+    if len(value) == 13:
+        return value
+
+    isbn = '978%s' % value[:9]
+    sum_even = 3 * sum(map(int, [isbn[1], isbn[3], isbn[5], isbn[7], isbn[9], isbn[11]]))
+    sum_odd = sum(map(int, [isbn[0], isbn[2], isbn[4], isbn[6], isbn[8], isbn[10]]))
+    remainder = (sum_even + sum_odd) % 10
+    check = 10 - remainder if remainder else 0
+    return '%s%s' % (isbn, check)
+
+
+def is_isbn10(value):
+    """
+    Check that a value is an ISBN-10 with a valid check digit.
+    """
+    if not ISBN10_REGEX.match(value):
+        return False
+
+    digits = [10 if c == 'X' else int(c) for c in value]
+    return sum((10 - i) * digit for i, digit in enumerate(digits)) % 11 == 0
+
+
+def canonical_isbn(value):
+    """
+    Get the key used to match a book by ISBN.
+
+    Valid ISBN-10s are converted to ISBN-13, so both forms of an ISBN have
+    the same key.  Anything else, such as an ASIN, is just cleaned up, so
+    that ISBNs with typos in the check digit don't collide.
+
+    Args:
+        value (str): ISBN-10, ISBN-13 or ASIN, possibly with hyphens or
+            missing leading zeros.
+
+    Returns:
+        str: ISBN-13, or the cleaned up value if it isn't an ISBN.
+
+    """
+    value = re.sub(r'[\s-]', '', value).upper()
+
+    # Spreadsheets drop the leading zeros of ISBNs stored as numbers
+    if value.isdigit() and 0 < len(value) < 10:
+        value = value.zfill(10)
+
+    if is_isbn10(value):
+        return to_isbn13(value)
+
+    return value
+
+
+class ISBNIndex(object):
+    """
+    Find the key of a mapping that matches any form of an ISBN.
+
+    Each key is reduced to its canonical ISBN once, when the index is
+    built, so each lookup is a single dictionary lookup.
+    """
+    def __init__(self, keys=()):
+        self._keys = {}
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        """
+        Add a key to the index.  The first key added for an ISBN wins.
+        """
+        self._keys.setdefault(canonical_isbn(key), key)
+
+    def get(self, value, default=None):
+        """
+        Get the key that matches an ISBN, or `default` if none does.
+        """
+        return self._keys.get(canonical_isbn(value), default)
+
+    def __contains__(self, value):
+        return canonical_isbn(value) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
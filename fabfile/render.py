@@ -5,14 +5,45 @@ Commands for rendering various parts of the app stack.
 """
 
 from glob import glob
+import hashlib
+from multiprocessing import Pool, cpu_count
 import os
 
 from fabric.api import local, task
+from jinja2 import TemplateNotFound
 
 import app
+import app_config
 import json
 import csv
 
+from utils import write_atomic
+from render_utils import flatten_app_config
+
+# Number of processes used by `render_all`
+RENDER_WORKERS = cpu_count()
+# Pages sent to a render worker at a time
+RENDER_CHUNK_SIZE = 8
+
+# Hashes of the inputs of each rendered page, see `render_all`
+RENDER_MANIFEST_PATH = 'data/render-manifest.json'
+# Code and data files every page depends on
+RENDER_INPUT_PATHS = ['app.py', 'render_utils.py', app_config.COPY_PATH,
+                      app_config.COPY_SNAPSHOT_PATH]
+# Data files read by a view, besides the book or tag it renders
+VIEW_INPUT_PATHS = {
+    'index': ['data/featured.json', 'www/static-data/books.json'],
+}
+
+# Compiled JS and CSS includes, by path. See `render_utils.Includer`.
+_compiled_includes = {}
+# Templates loaded while rendering the current page
+_page_templates = set()
+# Hashes of template sources, by name
+_template_hashes = {}
+# Hash of the inputs shared by every page in this render
+_render_inputs = [None]
+
 def _fake_context(path):
     """
     Create a fact request context for a given path.
@@ -86,19 +117,112 @@ def copytext_js():
     with open('www/js/copy.js', 'w') as f:
         f.write(response.data)
 
-@task(default=True)
-def render_all():
+def _hash(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=repr)).hexdigest()
+
+def _hash_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except IOError:
+        return None
+
+def _track_templates():
     """
-    Render HTML templates and compile assets.
+    Record the name of every template loaded, including templates that
+    are extended or included, in `_page_templates`.
+    """
+    env = app.app.jinja_env
+
+    if getattr(env.get_template, 'tracked', False):
+        return
+
+    get_template = env.get_template
+
+    def tracked_get_template(name, *args, **kwargs):
+        template = get_template(name, *args, **kwargs)
+        _page_templates.add(template.name)
+        return template
+
+    tracked_get_template.tracked = True
+    env.get_template = tracked_get_template
+
+def _get_template_hash(name):
+    if name not in _template_hashes:
+        env = app.app.jinja_env
+        try:
+            source = env.loader.get_source(env, name)[0]
+        except TemplateNotFound:
+            source = None
+        _template_hashes[name] = _hash(source)
+
+    return _template_hashes[name]
+
+def _get_page_hash(job, templates):
+    """
+    Hash everything a page was rendered from: the templates it used, the
+    book or tag it shows, the data files its view reads, the copy sheet
+    and the names of the compiled assets.
+    """
+    inputs = job[4]
+
+    return _hash([
+        _render_inputs[0],
+        inputs,
+        [(name, _get_template_hash(name)) for name in templates],
+    ])
+
+def _render_page(job):
+    """
+    Render a view to a file. Runs in a worker process for `render_all`.
+
+    Returns:
+        tuple: The filename and the names of the templates it used.
+
     """
     from flask import g
 
-    less()
-    jst()
-    app_config_js()
-    copytext_js()
+    rule_string, name, slug, filename, inputs = job
+
+    print 'Rendering %s' % filename
+
+    _page_templates.clear()
+
+    # Render views, reusing compiled assets
+    with _fake_context(rule_string):
+        g.compile_includes = True
+        g.compiled_includes = _compiled_includes
 
-    compiled_includes = {}
+        # Share pages are rendered from the records loaded by
+        # `_get_render_jobs`, instead of loading the catalog for each page
+        if name == 'share':
+            content = app.render_share(inputs['book'], inputs['cover']).data
+        elif name == 'tag_share':
+            content = app.render_tag_share(slug, inputs['images']).data
+        elif slug is None:
+            content = _view_from_name(name)().data
+        else:
+            content = _view_from_name(name)(slug).data
+
+    # Write rendered view
+    # NB: Flask response object has utf-8 encoded the data
+    write_atomic(filename, content)
+
+    return filename, sorted(_page_templates)
+
+def _get_render_jobs():
+    """
+    List the pages to render as `(rule, view name, slug, filename, inputs)`
+    tuples, grouped by view. `inputs` holds the data the page is rendered
+    from, or hashes of it.
+    """
+    try:
+        with open(app_config.COVER_INDEX_PATH) as f:
+            cover_index = json.load(f)
+    except (IOError, ValueError):
+        cover_index = {'covers': {}, 'tags': {}}
+
+    views = []
 
     # Loop over all views in the app
     for rule in app.app.url_map.iter_rules():
@@ -110,76 +234,133 @@ def render_all():
             print 'Skipping %s' % name
             continue
 
-        # Convert trailing slashes to index.html files
-        if rule_string.endswith('/'):
-            filename = 'www' + rule_string + 'index.html'
-        elif rule_string.endswith('.html'):
-            filename = 'www' + rule_string
+        if rule_string.startswith('/share'):
+            with open('www/static-data/books.json', 'rb') as readfile:
+                books = json.load(readfile)
+
+            views.append([
+                (rule_string, name, book['slug'], 'www/share/%s.html' % book['slug'], {
+                    'book': book,
+                    'cover': cover_index['covers'].get(book['slug']),
+                })
+                for book in books
+            ])
+        elif rule_string.startswith('/tag_share'):
+            with open('data/tag-audit.csv', 'r') as readfile:
+                tags = list(csv.DictReader(readfile))
+
+            views.append([
+                (rule_string, name, tag['slug'], 'www/tag_share/%s.html' % tag['slug'], {
+                    'tag': tag['slug'],
+                    'images': cover_index['tags'],
+                })
+                for tag in tags
+            ])
         else:
-            print 'Skipping %s' % name
-            continue
+            # Convert trailing slashes to index.html files
+            if rule_string.endswith('/'):
+                filename = 'www' + rule_string + 'index.html'
+            elif rule_string.endswith('.html'):
+                filename = 'www' + rule_string
+            else:
+                print 'Skipping %s' % name
+                continue
 
-        # Create the output path
-        dirname = os.path.dirname(filename)
+            inputs = dict((path, _hash_file(path))
+                          for path in VIEW_INPUT_PATHS.get(name, []))
+            views.append([(rule_string, name, None, filename, inputs)])
 
-        if not (os.path.exists(dirname)):
-            os.makedirs(dirname)
+    return views
 
-        print 'Rendering %s' % (filename)
+def _is_current(job, manifest):
+    """
+    Check if a page was rendered from the same inputs by a previous run.
+    """
+    filename = job[3]
+    entry = manifest.get(filename)
 
-        # Render views, reusing compiled assets
-        with _fake_context(rule_string):
-            g.compile_includes = True
-            g.compiled_includes = compiled_includes
+    if entry is None or not os.path.exists(filename):
+        return False
 
-            view = _view_from_name(name)
+    return entry['hash'] == _get_page_hash(job, entry['templates'])
 
-            if rule_string.startswith('/share'):
-                with open('www/static-data/books.json', 'rb') as readfile:
-                    books = json.load(readfile)
+@task(default=True)
+def render_all(workers=RENDER_WORKERS, force='false'):
+    """
+    Render HTML templates and compile assets.
+
+    Pages are rendered by a pool of `workers` processes. Pass `workers=1`
+    to render them one at a time.
+
+    Pages whose inputs haven't changed since they were last rendered are
+    skipped, see `RENDER_MANIFEST_PATH`. Pass `force=true` to render
+    every page.
+    """
+    workers = int(workers)
+    force = force.lower() == 'true'
+
+    less()
+    jst()
+    app_config_js()
+    copytext_js()
 
-                for book in books:
-                    filename = 'www/share/%s.html' % book['slug']
-                    print "will make %s" % filename
-                    dirname = os.path.dirname(filename)
+    _compiled_includes.clear()
+    _template_hashes.clear()
+    _track_templates()
 
-                    if not (os.path.exists(dirname)):
-                        os.makedirs(dirname)
+    try:
+        with open(RENDER_MANIFEST_PATH) as f:
+            previous_manifest = json.load(f)
+    except (IOError, ValueError):
+        previous_manifest = {}
 
-                    content = view(book['slug']).data
+    views = _get_render_jobs()
 
-                    compiled_includes = g.compiled_includes
+    # Render the first page of each view here, so assets are compiled
+    # once and every worker links to the same compiled files
+    rendered = [_render_page(jobs[0]) for jobs in views if jobs]
 
-                    # Write rendered view
-                    # NB: Flask response object has utf-8 encoded the data
-                    with open(filename, 'w') as f:
-                        f.write(content)
-            elif rule_string.startswith('/tag_share'):
-                with open('data/tag-audit.csv', 'r') as readfile:
-                    tags = list(csv.DictReader(readfile))
-                for tag in tags:
-                    filename = 'www/tag_share/%s.html' % tag['slug']
-                    print "will make %s" % filename
-                    dirname = os.path.dirname(filename)
+    # The compiled asset names are content hashes, so they only change
+    # when the assets do
+    _render_inputs[0] = _hash([
+        [(path, _hash_file(path)) for path in RENDER_INPUT_PATHS],
+        flatten_app_config(),
+        sorted(_compiled_includes.items()),
+    ])
 
-                    if not (os.path.exists(dirname)):
-                        os.makedirs(dirname)
+    jobs = [job for jobs in views for job in jobs[1:]]
 
-                    content = view(tag['slug']).data
+    if not force:
+        jobs = [job for job in jobs if not _is_current(job, previous_manifest)]
 
-                    compiled_includes = g.compiled_includes
+    print 'Rendering %i changed pages' % len(jobs)
 
-                    # Write rendered view
-                    # NB: Flask response object has utf-8 encoded the data
-                    with open(filename, 'w') as f:
-                        f.write(content)
-            else:
-                content = view().data
+    if workers > 1 and len(jobs) > 1:
+        # Workers are forked from this process, so they share the loaded
+        # app, data and compiled includes
+        pool = Pool(workers)
+        try:
+            rendered.extend(pool.imap_unordered(_render_page, jobs, RENDER_CHUNK_SIZE))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        rendered.extend(_render_page(job) for job in jobs)
+
+    # Keep the entries of pages that were skipped, and drop pages that
+    # are no longer rendered
+    templates = dict(rendered)
+    manifest = {}
 
-                compiled_includes = g.compiled_includes
+    for job in [job for jobs in views for job in jobs]:
+        filename = job[3]
 
-                # Write rendered view
-                # NB: Flask response object has utf-8 encoded the data
-                with open(filename, 'w') as f:
-                    f.write(content)
+        if filename in templates:
+            manifest[filename] = {
+                'templates': templates[filename],
+                'hash': _get_page_hash(job, templates[filename]),
+            }
+        elif filename in previous_manifest:
+            manifest[filename] = previous_manifest[filename]
 
+    write_atomic(RENDER_MANIFEST_PATH, json.dumps(manifest, sort_keys=True))
@@ -9,6 +9,7 @@ import os
 
 from fabric.api import task
 from oauth import get_document, get_credentials
+from render_utils import write_copy_snapshot
 from termcolor import colored
 
 @task(default=True)
@@ -27,3 +28,11 @@ def update():
         return
 
     get_document(app_config.COPY_GOOGLE_DOC_KEY, app_config.COPY_PATH)
+    snapshot()
+
+@task
+def snapshot():
+    """
+    Save the parsed copy as JSON, so it loads without parsing the Excel file.
+    """
+    write_copy_snapshot(app_config.COPY_PATH, app_config.COPY_SNAPSHOT_PATH)
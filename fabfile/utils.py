@@ -7,6 +7,10 @@ from boto.s3.connection import OrdinaryCallingFormat
 Utilities used by multiple commands.
 """
 
+import errno
+import os
+import tempfile
+
 from fabric.api import prompt, task, local
 
 def confirm(message):
@@ -19,6 +23,33 @@ def confirm(message):
         exit()
 
 
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def write_atomic(path, content):
+    """
+    Write a file by writing a temporary file and renaming it into place.
+    """
+    dirname = os.path.dirname(path)
+    _makedirs(dirname)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # mkstemp creates files only readable by their owner
+        os.chmod(tmp_path, 0644)
+        os.rename(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+
 @task
 def install_font(force='true'):
     """
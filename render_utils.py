@@ -2,8 +2,10 @@
 
 import codecs
 from datetime import datetime
+import hashlib
 import json
-import time
+import os
+import threading
 import urllib
 import subprocess
 
@@ -14,6 +16,13 @@ from smartypants import smartypants
 import app_config
 import copytext
 
+# Characters of a compiled include's hash added to its URL
+INCLUDE_HASH_LENGTH = 10
+
+# Parsed copy spreadsheets, by path. See `load_copy`.
+_copy_cache = {}
+_copy_lock = threading.Lock()
+
 class BetterJSONEncoder(json.JSONEncoder):
     """
     A JSON encoder that intelligently handles datetimes.
@@ -61,23 +70,27 @@ class Includer(object):
     def render(self, path):
         if getattr(g, 'compile_includes', False):
             if path in g.compiled_includes:
-                timestamp_path = g.compiled_includes[path]
+                versioned_path = g.compiled_includes[path]
             else:
-                # Add a querystring to the rendered filename to prevent caching
-                timestamp_path = '%s?%i' % (path, int(time.time()))
-
                 out_path = 'www/%s' % path
 
-                if path not in g.compiled_includes:
-                    print 'Rendering %s' % out_path
+                print 'Rendering %s' % out_path
+
+                content = self._compress()
+
+                with codecs.open(out_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
 
-                    with codecs.open(out_path, 'w', encoding='utf-8') as f:
-                        f.write(self._compress())
+                # Add a hash of the content to the rendered filename to
+                # prevent caching, without changing pages that link to it
+                # when the content is the same
+                digest = hashlib.md5(content.encode('utf-8')).hexdigest()
+                versioned_path = '%s?%s' % (path, digest[:INCLUDE_HASH_LENGTH])
 
                 # See "fab render"
-                g.compiled_includes[path] = timestamp_path
+                g.compiled_includes[path] = versioned_path
 
-            markup = Markup(self.tag_string % self._relativize_path(timestamp_path))
+            markup = Markup(self.tag_string % self._relativize_path(versioned_path))
         else:
             response = ','.join(self.includes)
 
@@ -175,6 +188,107 @@ def flatten_app_config():
 
     return config
 
+def _stat(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+# The copy snapshot reads and rebuilds copytext's internals (`Copy._copy`,
+# `Sheet._columns`, `Row._row`), so it depends on the copytext==0.1.9 pinned
+# in requirements.txt. Check both functions below when upgrading copytext.
+def write_copy_snapshot(path=None, snapshot_path=None):
+    """
+    Parse a copy spreadsheet and save it as JSON, so `load_copy` can load
+    it without parsing the spreadsheet.
+    """
+    path = path or app_config.COPY_PATH
+    snapshot_path = snapshot_path or app_config.COPY_SNAPSHOT_PATH
+
+    copy = copytext.Copy(path)
+
+    sheets = [
+        [name, sheet._columns, [row._row for row in sheet]]
+        for name, sheet in copy._copy.items()
+    ]
+
+    tmp_path = '%s.tmp' % snapshot_path
+
+    with open(tmp_path, 'w') as f:
+        json.dump({'sheets': sheets}, f)
+
+    os.rename(tmp_path, snapshot_path)
+
+def _load_copy_snapshot(path, snapshot_path):
+    """
+    Build a `Copy` from a snapshot written by `write_copy_snapshot`.
+    """
+    with open(snapshot_path) as f:
+        snapshot = json.load(f)
+
+    copy = copytext.Copy.__new__(copytext.Copy)
+    copy._filename = path
+    copy._copy = {}
+
+    for name, columns, rows in snapshot['sheets']:
+        rows = [dict(zip(columns, row)) for row in rows]
+        copy._copy[name] = copytext.Sheet(name, rows, columns)
+
+    return copy
+
+def load_copy(path=None, snapshot_path=None):
+    """
+    Load a copy spreadsheet, parsing it again only when the file changes.
+
+    If the snapshot written by `fab text.update` is newer than the
+    spreadsheet, it's loaded instead, which is much faster.
+
+    Parsed copy isn't modified after it's loaded, so the same `Copy` is
+    shared by every request and rendered page in the process.
+    """
+    if path is None:
+        path = app_config.COPY_PATH
+        snapshot_path = snapshot_path or app_config.COPY_SNAPSHOT_PATH
+
+    with _copy_lock:
+        stat = _stat(path)
+        snapshot_stat = _stat(snapshot_path) if snapshot_path else None
+
+        use_snapshot = snapshot_stat is not None and (
+            stat is None or snapshot_stat.st_mtime >= stat.st_mtime)
+
+        if use_snapshot:
+            version = (snapshot_path, snapshot_stat.st_mtime, snapshot_stat.st_size)
+        elif stat is not None:
+            version = (path, stat.st_mtime, stat.st_size)
+        else:
+            _copy_cache.pop(path, None)
+            # Raises CopyException
+            return copytext.Copy(path)
+
+        cached = _copy_cache.get(path)
+
+        if cached is None or cached[0] != version:
+            copy = None
+
+            if use_snapshot:
+                try:
+                    copy = _load_copy_snapshot(path, snapshot_path)
+                except IOError:
+                    # Removed since it was stat'd
+                    print 'Ignoring missing copy snapshot %s' % snapshot_path
+                except (ValueError, KeyError, TypeError):
+                    # Parse the spreadsheet instead, until either changes
+                    print 'Ignoring corrupt copy snapshot %s' % snapshot_path
+
+            if copy is None:
+                copy = copytext.Copy(path)
+
+            cached = (version, copy)
+            _copy_cache[path] = cached
+
+        return cached[1]
+
 def make_context(asset_depth=0):
     """
     Create a base-context for rendering views.
@@ -187,7 +301,7 @@ def make_context(asset_depth=0):
     context = flatten_app_config()
 
     try:
-        context['COPY'] = copytext.Copy(app_config.COPY_PATH)
+        context['COPY'] = load_copy()
     except copytext.CopyException:
         pass
 
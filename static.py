@@ -8,9 +8,8 @@ import subprocess
 from flask import abort, make_response
 
 import app_config
-import copytext
 from flask import Blueprint
-from render_utils import BetterJSONEncoder, flatten_app_config
+from render_utils import BetterJSONEncoder, flatten_app_config, load_copy
 
 static = Blueprint('static', __name__)
 
@@ -42,7 +41,7 @@ def _app_config_js():
 # Render copytext
 @static.route('/js/copy.js')
 def _copy_js():
-    copy = 'window.COPY = ' + copytext.Copy(app_config.COPY_PATH).json()
+    copy = 'window.COPY = ' + load_copy().json()
 
     return make_response(copy, 200, { 'Content-Type': 'application/javascript' })
 
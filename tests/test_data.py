@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from fabfile import data
+
+class ProcessTagsTestCase(unittest.TestCase):
+    """
+    Test turning a book's tags into slugs ordered like the tags sheet.
+    """
+    def setUp(self):
+        self.tag_order = dict(data.TAG_ORDER)
+        self.tags_to_slugs = dict(data.TAGS_TO_SLUGS)
+
+        data.TAG_ORDER.clear()
+        data.TAG_ORDER.update({'funny': 1, 'eye-opening': 2, 'staff-picks': 3})
+        data.TAGS_TO_SLUGS.clear()
+        data.TAGS_TO_SLUGS.update({
+            'funny stuff': 'funny',
+            'eye-opening reads': 'eye-opening',
+            'staff picks': 'staff-picks',
+        })
+
+        self.book = data.Book.__new__(data.Book)
+        self.book.title = 'Test'
+
+    def tearDown(self):
+        data.TAG_ORDER.clear()
+        data.TAG_ORDER.update(self.tag_order)
+        data.TAGS_TO_SLUGS.clear()
+        data.TAGS_TO_SLUGS.update(self.tags_to_slugs)
+
+    def test_sorted_by_sheet_order(self):
+        tags = self.book._process_tags(u'Staff Picks,Funny Stuff,Eye-Opening Reads')
+
+        self.assertEqual(tags, ['funny', 'eye-opening', 'staff-picks'])
+
+    def test_unknown_and_duplicate_tags(self):
+        tags = self.book._process_tags(u'Staff Picks, Nope,Staff Picks,')
+
+        self.assertEqual(tags, ['staff-picks'])
+
+class GetTagsTestCase(unittest.TestCase):
+    """
+    Test reading the tags sheet again after it changes.
+    """
+    def setUp(self):
+        self.load_copy = data.load_copy
+        self.maps = [(m, dict(m)) for m in
+                     (data.TAG_ORDER, data.TAGS_TO_SLUGS, data.SLUGS_TO_TAGS)]
+
+    def tearDown(self):
+        data.load_copy = self.load_copy
+        for m, saved in self.maps:
+            m.clear()
+            m.update(saved)
+
+    def get_tags(self, rows):
+        data.load_copy = lambda: {'tags': rows}
+        data.get_tags()
+
+    def test_first_row_wins(self):
+        self.get_tags([['funny', 'Funny Stuff'], ['sad', 'Sad'], ['funny', 'Funny']])
+
+        self.assertEqual(data.TAG_ORDER, {'funny': 1, 'sad': 2})
+
+    def test_changed_sheet(self):
+        self.get_tags([['funny', 'Funny Stuff'], ['sad', 'Sad']])
+        self.get_tags([['sad', 'Sad'], ['staff-picks', 'Staff Picks']])
+
+        self.assertEqual(data.TAG_ORDER, {'sad': 1, 'staff-picks': 2})
+        self.assertEqual(data.SLUGS_TO_TAGS, {'sad': 'Sad', 'staff-picks': 'Staff Picks'})
+        self.assertEqual(data.TAGS_TO_SLUGS, {'sad': 'sad', 'staff picks': 'staff-picks'})
+
+class FetchBookLinksTestCase(unittest.TestCase):
+    """
+    Test building books from the book pages fetched by worker threads.
+    """
+    def setUp(self):
+        self.get = data.fetch.get
+        self.requests = []
+        data.fetch.get = self.fake_get
+
+        self.row = {
+            'title': u'Test Book',
+            'book_seamus_id': '123',
+            'author': u'Author',
+            'hide_ibooks': '',
+            'text': u'Text',
+            'reviewer': u'Reviewer',
+            'reviewer id': u'',
+            'reviewer link': u'',
+            'html text': '',
+            'isbn': u'0306406152',
+            'asin': u'',
+            'oclc': u'',
+            'itunes_id': u'',
+            'goodreads_id': u'',
+            'external links html': u'',
+            'tags': u'',
+        }
+
+    def tearDown(self):
+        data.fetch.get = self.get
+
+    def fake_get(self, url, params=None, source=None):
+        self.requests.append(url)
+        response = requests.Response()
+        response.status_code = 404
+        response._content = '<html><div class="readexcerpt"><a></a></div></html>'
+        return response
+
+    def test_page_fetched_once(self):
+        book, previous, links = data._fetch_book_links((self.row, None))
+        b = data._build_book(book, links)
+
+        self.assertEqual(self.requests, ['http://www.npr.org/123'])
+        self.assertEqual(b.links, [{
+            'category': 'Read an excerpt',
+            'url': 'http://www.npr.org/123#excerpt',
+            'title': '',
+        }])
+
+    def test_failed_fetch(self):
+        def fail(url, params=None, source=None):
+            raise requests.ConnectionError('offline')
+
+        data.fetch.get = fail
+        book, previous, links = data._fetch_book_links((self.row, None))
+
+        self.assertEqual(data._build_book(book, links), None)
+
+class LookupItunesIdsTestCase(unittest.TestCase):
+    """
+    Test matching batched iTunes lookup results to books.
+    """
+    def setUp(self):
+        self.get = data.fetch.get
+        self.requests = []
+        data.fetch.get = self.fake_get
+
+    def tearDown(self):
+        data.fetch.get = self.get
+
+    def fake_get(self, url, params=None, source=None):
+        self.requests.append((url, params))
+        response = requests.Response()
+        response.status_code = 200
+
+        if url.endswith('/lookup'):
+            results = [
+                {'isbn': '9780000000002', 'trackViewUrl': 'https://itunes.apple.com/us/book/b/id222?mt=11'},
+                {'isbn': '9780306406157', 'trackName': 'Other', 'trackViewUrl': 'https://itunes.apple.com/us/book/d/id444?mt=11'},
+                {'trackName': 'First Book: A Novel', 'trackViewUrl': 'https://itunes.apple.com/us/book/a/id111?mt=11'},
+            ]
+        else:
+            results = [
+                {'trackViewUrl': 'https://itunes.apple.com/us/book/c/id333?mt=11'},
+            ]
+
+        response._content = json.dumps({'resultCount': len(results), 'results': results})
+        return response
+
+    def test_lookup_with_title_fallback(self):
+        itunes_ids = data.Book.lookup_itunes_ids([
+            ('9780000000001', u'First Book'),
+            ('9780000000002', u'Second Book'),
+            ('9780000000003', u'Third Book'),
+        ])
+
+        self.assertEqual(itunes_ids, {
+            '9780000000001': '111',
+            '9780000000002': '222',
+            '9780000000003': '333',
+        })
+        self.assertEqual([url for url, params in self.requests], [
+            'https://itunes.apple.com/lookup',
+            'https://itunes.apple.com/search',
+        ])
+        self.assertEqual(self.requests[1][1]['term'], 'Third Book')
+
+    def test_isbn10_matched_to_isbn13_result(self):
+        itunes_ids = data.Book.lookup_itunes_ids([
+            ('0306406152', u'Not The Title On iTunes'),
+            ('9780000000002', u'Second Book'),
+        ])
+
+        self.assertEqual(itunes_ids['0306406152'], '444')
+        self.assertEqual(itunes_ids['9780000000002'], '222')
+        self.assertEqual(len(self.requests), 1)
+
+class SerializeBookTestCase(unittest.TestCase):
+    """
+    Test writing a book to books.json.
+    """
+    def test_compact_ordered_allowlist(self):
+        sizes = {}
+        book = {
+            'title': u'Test',
+            'slug': 'test',
+            'tags': ['funny', 'staff-picks'],
+            'genre': None,
+            'html_text': False,
+            'hide_ibooks': '',
+            'oclc': '123',
+        }
+
+        serialized = data._serialize_book(book, sizes)
+
+        self.assertEqual(serialized,
+            '{"slug":"test","title":"Test","tags":["funny","staff-picks"]}')
+        self.assertEqual(sizes, {'slug': 14, 'title': 15, 'tags': 31})
+
+    def test_book_fragment(self):
+        book = data.Book.__new__(data.Book)
+        for field in data.Book.__slots__:
+            setattr(book, field, None)
+        book.slug = 'test'
+        book.title = u'Test'
+
+        self.assertEqual(set(book.to_dict()), set(data.Book.__slots__))
+        self.assertEqual(book.to_json_fragment(), '{"slug":"test","title":"Test"}')
+
+class RenderTweetTestCase(unittest.TestCase):
+    """
+    Test linking the entities in a featured tweet.
+    """
+    def setUp(self):
+        self.tweet = {
+            'id': 1,
+            'id_str': '1',
+            'text': u'#books http://t.co/a #books',
+            'created_at': 'Thu Dec 03 15:00:00 +0000 2015',
+            'favorite_count': 2,
+            'retweet_count': 3,
+            'entities': {
+                'hashtags': [
+                    {'text': 'books', 'indices': [0, 6]},
+                    {'text': 'books', 'indices': [21, 27]},
+                ],
+                'urls': [
+                    {'url': 'http://t.co/a', 'display_url': 'npr.org', 'indices': [7, 20]},
+                ],
+            },
+            'user': {
+                'id': 5,
+                'name': 'NPR Books',
+                'screen_name': 'nprbooks',
+                'profile_image_url': 'http://example.com/a.png',
+                'url': 'http://npr.org',
+                'followers_count': 10,
+            },
+        }
+
+    def test_entities_linked_in_place(self):
+        html = data._render_tweet(self.tweet)['html']
+
+        self.assertEqual(html.count('https://twitter.com/hashtag/books'), 2)
+        self.assertEqual(html.count('href="http://t.co/a"'), 1)
+        self.assertTrue(html.endswith('>#books</a>'))
+        self.assertTrue('</a> <a href="http://t.co/a"' in html)
+
+    def test_signature(self):
+        signature = data._tweet_signature(self.tweet)
+
+        self.tweet['user']['followers_count'] = 11
+        self.assertEqual(data._tweet_signature(self.tweet), signature)
+
+        self.tweet['favorite_count'] = 4
+        self.assertNotEqual(data._tweet_signature(self.tweet), signature)
+
+class LoadPreviousBooksTestCase(unittest.TestCase):
+    """
+    Test deciding whether books from the last run can be reused.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = (data.BOOKS_JSON_PATH, data.BOOKS_MANIFEST_PATH)
+        self.schema_version = data.BOOKS_SCHEMA_VERSION
+
+        data.BOOKS_JSON_PATH = os.path.join(self.tmpdir, 'books.json')
+        data.BOOKS_MANIFEST_PATH = os.path.join(self.tmpdir, 'books-manifest.json')
+
+        with open(data.BOOKS_JSON_PATH, 'w') as f:
+            f.write('[\n{"isbn":"0306406152","slug":"test"}\n]')
+
+        with open(data.BOOKS_MANIFEST_PATH, 'w') as f:
+            json.dump({
+                'version': data._get_books_version(),
+                'tags': data._hash_tags(),
+                'rows': {'9780306406157': 'hash'},
+            }, f)
+
+    def tearDown(self):
+        data.BOOKS_JSON_PATH, data.BOOKS_MANIFEST_PATH = self.paths
+        data.BOOKS_SCHEMA_VERSION = self.schema_version
+        shutil.rmtree(self.tmpdir)
+
+    def test_reused(self):
+        row_hashes, offsets = data._load_previous_books()
+
+        self.assertEqual(row_hashes, {'9780306406157': 'hash'})
+        self.assertEqual(offsets, {'9780306406157': 2})
+
+    def test_rebuilt_when_built_differently(self):
+        data.BOOKS_SCHEMA_VERSION += 1
+
+        self.assertEqual(data._load_previous_books(), ({}, {}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+import shutil
+import tempfile
+import unittest
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from fabfile import fetch, instrument
+from fabfile.http_cache import HTTPCache
+
+class FakeSession(object):
+    """
+    Returns queued responses and records the requests made.
+    """
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        status_code, content, response_headers = self.responses.pop(0)
+
+        response = requests.Response()
+        response.url = url
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(response_headers)
+        response._content = content
+        return response
+
+class GetTestCase(unittest.TestCase):
+    """
+    Test fetching through the HTTP cache.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = fetch.CACHE
+        self.session = fetch.SESSION
+        self.ttls = dict(fetch.HTTP_CACHE_TTLS)
+
+        fetch.CACHE = HTTPCache(self.tmpdir, 1000)
+        fetch.SESSION = FakeSession()
+        fetch.HTTP_CACHE_TTLS['test'] = 60
+
+    def tearDown(self):
+        fetch.CACHE = self.cache
+        fetch.SESSION = self.session
+        fetch.OFFLINE = False
+        fetch.HTTP_CACHE_TTLS.clear()
+        fetch.HTTP_CACHE_TTLS.update(self.ttls)
+        shutil.rmtree(self.tmpdir)
+
+    def test_cached_within_ttl(self):
+        fetch.SESSION.responses.append((200, 'body', {}))
+
+        self.assertFalse(fetch.get('http://example.com/a', source='test').from_cache)
+
+        response = fetch.get('http://example.com/a', source='test')
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.content, 'body')
+        self.assertEqual(len(fetch.SESSION.requests), 1)
+
+    def test_revalidated_after_ttl(self):
+        fetch.SESSION.responses.append((200, 'body', {'etag': '"1"'}))
+        fetch.SESSION.responses.append((304, '', {}))
+
+        fetch.get('http://example.com/a', source='expired')
+        response = fetch.get('http://example.com/a', source='expired')
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.content, 'body')
+        self.assertEqual(fetch.SESSION.requests[1][1], {'If-None-Match': '"1"'})
+
+    def test_revalidated_after_max_age(self):
+        fetch.SESSION.responses.append((200, 'body', {'etag': '"1"'}))
+        fetch.SESSION.responses.append((304, '', {}))
+
+        fetch.get('http://example.com/a', source='test')
+        response = fetch.get('http://example.com/a', source='test', max_age=0)
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(fetch.SESSION.requests[1][1], {'If-None-Match': '"1"'})
+
+    def test_changed_after_ttl(self):
+        fetch.SESSION.responses.append((200, 'old', {'etag': '"1"'}))
+        fetch.SESSION.responses.append((200, 'new', {'etag': '"2"'}))
+
+        fetch.get('http://example.com/a', source='expired')
+        response = fetch.get('http://example.com/a', source='expired')
+
+        self.assertFalse(response.from_cache)
+        self.assertEqual(fetch.CACHE.get('http://example.com/a')[1], 'new')
+
+    def test_offline_replay(self):
+        fetch.SESSION.responses.append((200, 'body', {}))
+        fetch.get('http://example.com/a', source='expired')
+
+        fetch.OFFLINE = True
+
+        response = fetch.get('http://example.com/a', source='expired')
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.content, 'body')
+        self.assertEqual(len(fetch.SESSION.requests), 1)
+
+        with self.assertRaises(fetch.OfflineError):
+            fetch.get('http://example.com/b', source='expired')
+
+    def test_throttled_counted(self):
+        fetch.RATE_LIMITS['limited'] = (1000, 1)
+        fetch.SESSION.responses.append((429, 'slow down', {}))
+        instrument.reset()
+
+        try:
+            response = fetch.get('http://example.com/a', source='limited')
+        finally:
+            del fetch.RATE_LIMITS['limited']
+
+        counters = instrument.get_report()['counters']
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(counters['http.throttled.limited'], 1)
+        self.assertEqual(fetch.CACHE.get('http://example.com/a'), (None, None))
+
+if __name__ == '__main__':
+    unittest.main()
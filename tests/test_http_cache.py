@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from fabfile import http_cache
+from fabfile.utils import write_atomic
+
+class HTTPCacheTestCase(unittest.TestCase):
+    """
+    Test storing, evicting and cleaning up cached responses.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = http_cache.HTTPCache(self.tmpdir, 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def count_objects(self):
+        return sum(len(files) for path, dirs, files
+                   in os.walk(os.path.join(self.tmpdir, 'objects')))
+
+    def test_put_and_get(self):
+        self.cache.put('http://example.com/a', 'body', source='npr',
+                       headers={'etag': '"1"', 'content-type': 'text/html'})
+
+        entry, content = self.cache.get('http://example.com/a')
+
+        self.assertEqual(content, 'body')
+        self.assertEqual(entry['etag'], '"1"')
+        self.assertEqual(entry['source'], 'npr')
+        self.assertEqual(self.cache.get('http://example.com/b'), (None, None))
+
+    def test_changed_content_replaces_object(self):
+        for i in range(20):
+            self.cache.put('http://example.com/a', 'body %i' % i * 20)
+
+        self.assertEqual(self.count_objects(), 1)
+        self.assertEqual(self.cache.get('http://example.com/a')[1], 'body 19' * 20)
+
+    def test_shared_object_kept(self):
+        self.cache.put('http://example.com/a', 'same')
+        self.cache.put('http://example.com/b', 'same')
+        self.cache.put('http://example.com/a', 'different')
+
+        self.assertEqual(self.cache.get('http://example.com/b')[1], 'same')
+        self.assertEqual(self.count_objects(), 2)
+
+    def test_shared_object_kept_after_reload(self):
+        self.cache.put('http://example.com/a', 'same')
+        self.cache.put('http://example.com/b', 'same')
+        self.cache.save()
+
+        cache = http_cache.HTTPCache(self.tmpdir, 1000)
+        cache.put('http://example.com/a', 'different')
+        self.assertEqual(cache.get('http://example.com/b')[1], 'same')
+
+        cache.put('http://example.com/b', 'different')
+        self.assertEqual(self.count_objects(), 1)
+
+    def test_evict_least_recently_used(self):
+        self.cache.put('http://example.com/a', 'a' * 400)
+        self.cache.put('http://example.com/b', 'b' * 400)
+        self.cache._index[self.cache._key('http://example.com/a')]['accessed'] -= 10
+        self.cache.put('http://example.com/c', 'c' * 400)
+        self.cache.save()
+
+        self.assertEqual(self.cache.get('http://example.com/a'), (None, None))
+        self.assertEqual(self.cache.get('http://example.com/b')[1], 'b' * 400)
+        self.assertEqual(self.cache.get('http://example.com/c')[1], 'c' * 400)
+        self.assertEqual(self.count_objects(), 2)
+
+    def test_save_sweeps_unused_objects(self):
+        orphan = self.cache._object_path('0' * 40)
+        write_atomic(orphan, 'orphan')
+        os.utime(orphan, (0, 0))
+
+        self.cache.put('http://example.com/a', 'body')
+        self.cache.save()
+
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(self.count_objects(), 1)
+
+    def test_index_persisted(self):
+        self.cache.put('http://example.com/a', 'body')
+        self.cache.save()
+
+        cache = http_cache.HTTPCache(self.tmpdir, 1000)
+
+        self.assertEqual(cache.get('http://example.com/a')[1], 'body')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+import unittest
+
+from fabfile import instrument
+
+class InstrumentTestCase(unittest.TestCase):
+    """
+    Test recording nested timers and counters.
+    """
+    def setUp(self):
+        instrument.reset()
+
+    def tearDown(self):
+        instrument.reset()
+
+    def test_nested_timers(self):
+        with instrument.timer('update'):
+            with instrument.timer('load_books'):
+                with instrument.timer('build_book', 'a'):
+                    pass
+                with instrument.timer('build_book', 'b'):
+                    pass
+            instrument.incr('http.requests', 3)
+
+        report = instrument.get_report()
+
+        self.assertEqual(sorted(report['timers']), [
+            'update',
+            'update/load_books',
+            'update/load_books/build_book',
+        ])
+        self.assertEqual(report['timers']['update/load_books/build_book']['count'], 2)
+        self.assertEqual(sorted(report['timers']['update/load_books/build_book']['items']), ['a', 'b'])
+        self.assertEqual(report['counters'], {'http.requests': 3})
+
+if __name__ == '__main__':
+    unittest.main()
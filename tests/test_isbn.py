@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import unittest
+
+from fabfile.isbn import canonical_isbn, ISBNIndex, to_isbn13
+
+class ToISBN13TestCase(unittest.TestCase):
+    """
+    Test converting ISBN-10s to ISBN-13s.
+    """
+    def test_isbn10(self):
+        self.assertEqual(to_isbn13('0316069353'), '9780316069359')
+
+    def test_isbn10_starting_with_978(self):
+        self.assertEqual(to_isbn13('9781566191'), '9789781566196')
+
+    def test_isbn13_starting_with_979(self):
+        self.assertEqual(to_isbn13('9791032305690'), '9791032305690')
+
+class CanonicalISBNTestCase(unittest.TestCase):
+    """
+    Test reducing the forms of an ISBN to one key.
+    """
+    def test_isbn10_and_isbn13_match(self):
+        self.assertEqual(canonical_isbn('0316069353'), '9780316069359')
+        self.assertEqual(canonical_isbn('978-0-316-06935-9'), '9780316069359')
+
+    def test_missing_leading_zeros(self):
+        self.assertEqual(canonical_isbn('316069353'), '9780316069359')
+
+    def test_check_digit_x(self):
+        self.assertEqual(canonical_isbn('080442957x'), '9780804429573')
+
+    def test_invalid_check_digit(self):
+        self.assertEqual(canonical_isbn('0316069354'), '0316069354')
+
+    def test_asin(self):
+        self.assertEqual(canonical_isbn(' b00ABC1234 '), 'B00ABC1234')
+
+class ISBNIndexTestCase(unittest.TestCase):
+    """
+    Test finding lookup keys by any form of an ISBN.
+    """
+    def test_get(self):
+        index = ISBNIndex(['316069353', '9780804429573', 'B00ABC1234'])
+
+        self.assertEqual(index.get('0316069353'), '316069353')
+        self.assertEqual(index.get('080442957X'), '9780804429573')
+        self.assertEqual(index.get('B00ABC1234'), 'B00ABC1234')
+        self.assertEqual(index.get('0000000000'), None)
+
+if __name__ == '__main__':
+    unittest.main()
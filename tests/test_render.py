@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fabfile import render
+
+class IsCurrentTestCase(unittest.TestCase):
+    """
+    Test deciding which pages need to be rendered again.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.html')
+
+        with open(self.filename, 'w') as f:
+            f.write('<html></html>')
+
+        render._render_inputs[0] = 'inputs'
+        render._template_hashes.clear()
+
+        self.job = ('/share/<slug>.html', 'share', 'test', self.filename,
+                    {'book': {'slug': 'test', 'title': 'Test'}, 'cover': None})
+        self.manifest = {
+            self.filename: {
+                'templates': ['share.html'],
+                'hash': render._get_page_hash(self.job, ['share.html']),
+            }
+        }
+
+    def tearDown(self):
+        render._render_inputs[0] = None
+        render._template_hashes.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_unchanged(self):
+        self.assertTrue(render._is_current(self.job, self.manifest))
+
+    def test_changed_book(self):
+        job = self.job[:4] + ({'book': {'slug': 'test', 'title': 'Tset'}, 'cover': None},)
+
+        self.assertFalse(render._is_current(job, self.manifest))
+
+    def test_changed_shared_inputs(self):
+        render._render_inputs[0] = 'other inputs'
+
+        self.assertFalse(render._is_current(self.job, self.manifest))
+
+    def test_changed_template(self):
+        render._template_hashes['share.html'] = 'edited'
+
+        self.assertFalse(render._is_current(self.job, self.manifest))
+
+    def test_missing_page(self):
+        os.remove(self.filename)
+
+        self.assertFalse(render._is_current(self.job, self.manifest))
+
+if __name__ == '__main__':
+    unittest.main()
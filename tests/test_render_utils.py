@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import copytext
+from openpyxl import Workbook
+
+import render_utils
+
+class LoadCopyTestCase(unittest.TestCase):
+    """
+    Test reusing parsed copy until the spreadsheet changes.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'copy.xlsx')
+        self.write_copy('Hello')
+
+    def tearDown(self):
+        render_utils._copy_cache.pop(self.path, None)
+        shutil.rmtree(self.tmpdir)
+
+    def write_copy(self, value):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.title = 'content'
+        sheet.append(['key', 'value'])
+        sheet.append(['greeting', value])
+        workbook.save(self.path)
+
+    def test_reused(self):
+        copy = render_utils.load_copy(self.path)
+
+        self.assertTrue(render_utils.load_copy(self.path) is copy)
+        self.assertEqual(unicode(copy['content']['greeting']), u'Hello')
+
+    def test_reloaded_when_changed(self):
+        copy = render_utils.load_copy(self.path)
+
+        self.write_copy('Hello again')
+        os.utime(self.path, (0, 0))
+
+        reloaded = render_utils.load_copy(self.path)
+
+        self.assertFalse(reloaded is copy)
+        self.assertEqual(unicode(reloaded['content']['greeting']), u'Hello again')
+
+    def test_missing(self):
+        os.remove(self.path)
+
+        with self.assertRaises(copytext.CopyException):
+            render_utils.load_copy(self.path)
+
+class CopySnapshotTestCase(unittest.TestCase):
+    """
+    Test loading copy from the snapshot written by `fab text.update`.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'copy.xlsx')
+        self.snapshot_path = os.path.join(self.tmpdir, 'copy.json')
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.title = 'tags'
+        sheet.append(['key', 'value', 'img'])
+        sheet.append(['funny', u'Funny Stuff \u2019', None])
+        sheet.append(['staff-picks', 'Staff Picks', 'staff'])
+        workbook.save(self.path)
+
+        render_utils.write_copy_snapshot(self.path, self.snapshot_path)
+
+    def tearDown(self):
+        render_utils._copy_cache.pop(self.path, None)
+        shutil.rmtree(self.tmpdir)
+
+    def load(self):
+        render_utils._copy_cache.pop(self.path, None)
+        return render_utils.load_copy(self.path, self.snapshot_path)
+
+    def test_same_as_spreadsheet(self):
+        copy = self.load()
+
+        self.assertEqual(copy.json(), copytext.Copy(self.path).json())
+        self.assertEqual(list(copy['tags']['funny']), ['funny', u'Funny Stuff \u2019', None])
+
+    def test_snapshot_preferred(self):
+        os.remove(self.path)
+
+        self.assertEqual(unicode(self.load()['tags']['staff-picks']), u'Staff Picks')
+
+    def test_older_snapshot_ignored(self):
+        with open(self.snapshot_path, 'w') as f:
+            f.write('not json')
+        os.utime(self.snapshot_path, (0, 0))
+
+        self.assertEqual(unicode(self.load()['tags']['staff-picks']), u'Staff Picks')
+
+    def test_snapshot_removed_after_stat(self):
+        def remove_and_load(path, snapshot_path):
+            os.remove(snapshot_path)
+            return load_copy_snapshot(path, snapshot_path)
+
+        load_copy_snapshot = render_utils._load_copy_snapshot
+        render_utils._load_copy_snapshot = remove_and_load
+
+        try:
+            copy = self.load()
+        finally:
+            render_utils._load_copy_snapshot = load_copy_snapshot
+
+        self.assertEqual(unicode(copy['tags']['staff-picks']), u'Staff Picks')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -51,6 +51,32 @@ var scroll_to = function($el) {
     $body.scrollTop(top);
 };
 
+/*
+ * Width of a cover in the book grid at each breakpoint, for the sizes
+ * attribute. Keep in sync with the widths of .card in less/app.less, which
+ * are capped at 300px by .book-outer-wrapper.
+ */
+var GRID_COVER_SIZES = [
+    '(max-width: 480px) 50vw',
+    '(max-width: 767px) 33vw',
+    '(max-width: 920px) 50vw',
+    '(max-width: 1100px) 33vw',
+    '(max-width: 1500px) 25vw',
+    '(max-width: 1800px) 20vw',
+    '(max-width: 2000px) 17vw',
+    '300px'
+].join(', ');
+
+/*
+ * Build a srcset attribute for a book's resized covers.
+ * Used by the book_grid_item and book_modal templates.
+ */
+var cover_srcset = function(book, ext) {
+    return _.map(book.cover_widths, function(width) {
+        return 'assets/cover/' + book.slug + '-' + width + '.' + ext + ' ' + width + 'w';
+    }).join(', ');
+};
+
 /*
  * Jump back to the top of the page.
  */
@@ -427,7 +453,19 @@ var relayout = _.throttle(function() {
  * Begin unveiling visible books in the grid.
  */
 var unveil_grid = function() {
-    $books_grid.find('img').unveil(500, function() {
+    var $images = $books_grid.find('img');
+
+    // Set the srcsets before unveil sets the src, so only one size loads.
+    $images.one('unveil', function() {
+        $(this).siblings('source').addBack().each(function() {
+            var srcset = this.getAttribute('data-srcset');
+            if (srcset) {
+                this.setAttribute('srcset', srcset);
+            }
+        });
+    });
+
+    $images.unveil(500, function() {
         $(this).imagesLoaded(function() {
             relayout();
         });